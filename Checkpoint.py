@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+class Checkpoint:
+    """
+    Checkpoints of long inference runs in a compact binary format: one compressed NumPy .npz archive per stage in a folder.
+    An archive is written to a temporary file first and then renamed over the previous one,
+    so a run killed while writing leaves the last complete checkpoint behind.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npz")
+
+    def contains(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def save(self, name: str, **arrays) -> None:
+        temp = self.path(name) + '.tmp'
+        with open(temp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path(name))
+
+    def load(self, name: str) -> dict:
+        """
+        The arrays of a checkpoint, or None if there is none.
+        """
+        if not self.contains(name):
+            return None
+
+        with np.load(self.path(name), allow_pickle=False) as archive:
+            return {key: archive[key] for key in archive.files}
+
+    @staticmethod
+    def encode_hypotheses(hypotheses, windowed: bool) -> dict:
+        """
+        Arrays of the causes, effects and (for windowed causes) windows r and s of (cause, effect) pairs.
+        Windowed causes are (cause, (r, s)) pairs, as in Inference.prima_facie.
+        """
+        if windowed:
+            causes = [cause for (cause, _), _ in hypotheses]
+            r = [window[0] for (_, window), _ in hypotheses]
+            s = [window[1] for (_, window), _ in hypotheses]
+        else:
+            causes = [cause for cause, _ in hypotheses]
+            r = s = [np.nan] * len(hypotheses)
+
+        return {'cause': np.array(causes, dtype=str), 'effect': np.array([effect for _, effect in hypotheses], dtype=str),
+                'r': np.array(r, dtype=float), 's': np.array(s, dtype=float)}
+
+    @staticmethod
+    def decode_hypotheses(arrays: dict, windowed: bool) -> list:
+        """
+        The (cause, effect) pairs encoded by encode_hypotheses().
+        """
+        causes = arrays['cause'].tolist()
+        effects = arrays['effect'].tolist()
+        if windowed:
+            causes = [(cause, (r, s)) for cause, r, s in zip(causes, arrays['r'].tolist(), arrays['s'].tolist())]
+
+        return list(zip(causes, effects))
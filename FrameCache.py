@@ -0,0 +1,121 @@
+import os
+import json
+import shutil
+import hashlib
+
+import pandas as pd
+import numpy as np
+
+class FrameCache:
+    """
+    On-disk cache of data frames in a binary columnar format: one NumPy .npy file per column and a meta.json file.
+    Text and categorical columns are stored as integer codes plus a list of categories.
+    Frames are read back memory-mapped, so opening a cached frame does not copy or parse the data.
+
+    Entries are keyed on a content hash of the source file and the parameters used to prepare it.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @staticmethod
+    def hash_file(path: str, block_size: int = 1 << 20) -> str:
+        """
+        SHA-256 of the contents of a file, read in blocks.
+        """
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha.update(block)
+
+        return sha.hexdigest()
+
+    def key(self, source: str, **params) -> str:
+        """
+        Cache key for a source file prepared with the given parameters.
+        """
+        description = json.dumps({'source': FrameCache.hash_file(source), **params}, sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), 'meta.json'))
+
+    def save(self, key: str, frame: pd.DataFrame) -> None:
+        FrameCache.write_frame(self.path(key), frame)
+
+    def load(self, key: str, mmap: bool = True) -> pd.DataFrame:
+        return FrameCache.read_frame(self.path(key), mmap)
+
+    @staticmethod
+    def write_frame(folder: str, frame: pd.DataFrame) -> None:
+        """
+        Write a data frame to *folder*. The folder is replaced as a whole once all columns are written.
+        """
+        # Encode all columns before writing anything, so that a frame that cannot be stored leaves no entry behind
+        arrays, columns = [], []
+        for i, name in enumerate(frame.columns):
+            array, column = FrameCache.encode_column(frame[name])
+            arrays.append(array)
+            columns.append({'name': name, 'file': f"column{i}.npy", **column})
+        meta = json.dumps({'rows': len(frame.index), 'columns': columns})
+
+        temp = folder.rstrip(os.sep) + '.tmp'
+        if os.path.exists(temp):
+            shutil.rmtree(temp)
+        os.makedirs(temp)
+
+        for array, column in zip(arrays, columns):
+            np.save(os.path.join(temp, column['file']), array)
+
+        with open(os.path.join(temp, 'meta.json'), 'w') as f:
+            f.write(meta)
+
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.replace(temp, folder)
+
+    @staticmethod
+    def encode_column(column: pd.Series):
+        """
+        The array to store for a column, and the metadata needed to decode it.
+        Text (object or string dtype) and categorical columns become integer codes plus categories, timezone-aware datetimes int64 nanoseconds since the epoch (UTC).
+        Columns that would only store as Python objects, which cannot be memory-mapped, raise a TypeError.
+        """
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, categories = column.cat.codes.to_numpy(), column.cat.categories
+        elif isinstance(column.dtype, pd.DatetimeTZDtype):
+            return column.to_numpy(dtype='datetime64[ns]').view(np.int64), {'timezone': str(column.dt.tz)}
+        elif column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            # Includes the string dtypes of pandas (the default for text read by read_csv since pandas 3)
+            codes, categories = pd.factorize(column)
+        else:
+            array = column.to_numpy()
+            if array.dtype == object:
+                raise TypeError(f"Column {column.name} of type {column.dtype} cannot be stored in a binary columnar format.")
+            return array, {}
+
+        # Store the codes with the integer width pandas uses for this number of categories, so they can be mapped without a copy
+        codes = codes.astype(pd.Categorical.from_codes([], categories=categories).codes.dtype)
+        return codes, {'categories': pd.Index(categories).tolist()}
+
+    @staticmethod
+    def read_frame(folder: str, mmap: bool = True) -> pd.DataFrame:
+        """
+        Read a data frame written by write_frame(). With *mmap*, the columns are memory-mapped instead of loaded.
+        """
+        with open(os.path.join(folder, 'meta.json')) as f:
+            meta = json.load(f)
+
+        data = {}
+        for column in meta['columns']:
+            values = np.load(os.path.join(folder, column['file']), mmap_mode='r' if mmap else None)
+            if 'categories' in column:
+                values = pd.Categorical.from_codes(values, categories=column['categories'])
+            elif 'timezone' in column:
+                values = pd.DatetimeIndex(values.view('datetime64[ns]')).tz_localize('UTC').tz_convert(column['timezone'])
+            data[column['name']] = values
+
+        return pd.DataFrame(data, copy=False)
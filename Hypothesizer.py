@@ -1,17 +1,27 @@
 import os
-import copy
+from multiprocessing import Pool
 from typing import Literal
 from typing import Tuple
 
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 from tqdm import tqdm
 
 import pm4py
 import pm4py.util.constants as constants
 
+from XESReader import XESReader
+from FrameCache import FrameCache
+from TraceStore import TraceStore
+from IncrementalInference import IncrementalInference
+from Instrumentation import instrumented
+
 class Hypothesizer:
-    def __init__(self, filepath: str) -> None:
+    # Peak memory of searching a chunk, relative to the size of the chunk and its observations (see build_out_of_core)
+    OUT_OF_CORE_OVERHEAD = 4
+
+    def __init__(self, filepath: str, lazy: bool = False, pb: bool = True, instrumentation = None, workers: int = None) -> None:
         self.activities: bool = False
         self.resources: bool = False
         self.idling: bool = False
@@ -23,9 +33,35 @@ class Hypothesizer:
         self.data: pd.DataFrame = None
         self.data_prepped: bool = False
         self.time_unit = None
+        self.integer_time = False
+        self.case_relative = False
         self.observations = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
 
-    def prepare_event_log(self, time_unit: Literal['seconds', 'minutes', 'hours'], sample = None):
+        # In lazy mode, observe_* calls are collected in the plan and only executed by build()
+        self.lazy = lazy
+        self.plan = []
+
+        # The log grouped by case, with and without sorting every case by time, built on first use and shared by all steps. See get_trace_store().
+        self.trace_stores = {}
+
+        # With more than one worker, the steps that only look within a case are run on contiguous chunks of cases in a pool of processes, see build_sharded().
+        # The log is sent to the pool once per build(), so the steps must be collected in lazy mode.
+        if workers != None and workers > 1 and not lazy:
+            raise ValueError(f"Building the search space with {workers} workers requires lazy=True, so that all steps are run in one pool by build().")
+        self.workers = workers
+
+        # pb: display progress bars. instrumentation: an Instrumentation sink to report every stage and observe_* call to, see Instrumentation.py
+        self.pb = pb
+        self.instrumentation = instrumentation
+
+    @instrumented('prepare_event_log', lambda self: {'rows_out': len(self.data.index), 'cases': self.data['case:concept:name'].nunique()})
+    def prepare_event_log(self, time_unit: Literal['seconds', 'minutes', 'hours'], sample = None, streaming: bool = False, columns: list = None, cache: str = None,
+                          integer_time: bool = False, case_relative: bool = False):
+        # streaming: parse XES files with the XESReader instead of pm4py, keeping only the given columns (all by default).
+        # cache: directory in which the prepared log is stored, keyed on the file contents and the parameters above. Later runs read it back memory-mapped.
+        # integer_time: keep timestamps as whole time units (int64, rounded down), so that comparisons are exact.
+        # case_relative: add the column 'time:relative', the time since the first event of the case. The steps that look at times within a case
+        # (observe_not_exists_attribute and observe_case_delay) then read it, instead of subtracting the case start times again.
         # Only XES or CSV is accepted
         accepted_ext = {'.xes', '.xes.gz', '.csv'}
         if ".xes.gz" in self.filepath:
@@ -45,11 +81,29 @@ class Hypothesizer:
         # Define factor for time unit conversion
         time_factor = 1 if time_unit == 'seconds' else 60 if time_unit == 'minutes' else 3600
         self.time_unit = str.lower(time_unit)
+        self.integer_time = integer_time
+        self.case_relative = case_relative
+
+        if cache != None:
+            cache = FrameCache(cache)
+            key = cache.key(self.filepath, time_unit=self.time_unit, sample=sample, streaming=streaming, columns=columns, integer_time=integer_time, case_relative=case_relative)
+            if cache.contains(key):
+                self.data = cache.load(key)
+                self.data_prepped = True
+                self.trace_stores = {}
+                print("Event log loaded from cache.")
+                return
 
         if str.lower(ext) == ".csv":
             data = pd.read_csv(self.filepath)
             # We assume names are already correct and the time is expressed in units starting at 0.
+            if integer_time:
+                data['time:timestamp'] = Hypothesizer.to_integer_units(data['time:timestamp'])
 
+        elif streaming:
+            # Parse the XES event log trace by trace, straight into typed columns with relative time units
+            data = XESReader(self.filepath, time_factor=time_factor, columns=columns, sample=sample, integer_time=integer_time).read()
+            data = data.sort_values('time:timestamp', ascending=True)
 
         else:
             # When the file is an XES event log, we need to convert it to a compatible Data Frame
@@ -59,13 +113,21 @@ class Hypothesizer:
             data = pm4py.convert_to_dataframe(data)
             data = data.sort_values('time:timestamp', ascending=True)
 
-            # Calculate the time units (in minutes)
-            data['time:timestamp'] = data['time:timestamp'].apply(lambda x: x.timestamp() / time_factor)
-            mintime = data['time:timestamp'].min()
-            data['time:timestamp'] = data['time:timestamp'].apply(lambda x: x - mintime)
+            # Calculate the time units relative to the earliest event, from the epoch nanoseconds of the timestamps
+            times = pd.to_datetime(data['time:timestamp'], utc=True).to_numpy(dtype='datetime64[ns]').view(np.int64)
+            data['time:timestamp'] = XESReader.to_time_units(times, time_factor, integer=integer_time)[0]
 
         self.data = data.reset_index(drop=True)
         self.data_prepped = True
+        self.trace_stores = {}
+        if case_relative:
+            self.data['time:relative'] = self.get_case_relative_times()
+        if cache != None:
+            try:
+                cache.save(key, self.data)
+            except TypeError as error:
+                # Nothing is written for a log that cannot be cached, so later runs prepare it again
+                print(f"Event log not cached: {error}")
         print("Event log loaded.")
 
     def observe_exists(self, activities: bool = False, resources: bool = False, attributes: set = None):
@@ -86,20 +148,21 @@ class Hypothesizer:
 
         search_attributes = {k : v for k,v in search_attributes.items() if v == True}
 
-        data = copy.deepcopy(self.data)
+        self.schedule('exists', search_attributes = search_attributes)
+
+    def find_exists(self, search_attributes: dict) -> pd.DataFrame:
+        # Only the columns making up the observation are read, instead of copying the whole log
+        observation = None
         # Add data column for the observations, based on the attributes set above
-        for col, val in tqdm(search_attributes.items(), desc = f"Observe EXISTS - {search_attributes}"):
+        for col, val in self.generate_iterator(search_attributes.items(), desc = f"Observe EXISTS - {search_attributes}"):
             if val and col != None:
-                if 'observation' not in data.columns:
-                    data = data.assign(observation = self.data[col])
+                if observation is None:
+                    observation = self.data[col]
                 else:
-                    data['observation'] = data[['observation', col]].agg(' - '.join, axis = 1)
-
-        self.observations = self.observations.append(data[["case:concept:name", "observation", "time:timestamp"]], ignore_index=True)
+                    observation = observation.astype(object) + ' - ' + self.data[col].astype(object)
 
-        self.arrange_observations()
         # print("Observations based on EXISTS added.")
-        del data
+        return pd.DataFrame({'case:concept:name' : self.data["case:concept:name"], 'observation' : observation, 'time:timestamp' : self.data["time:timestamp"]})
 
     def observe_not_exists_attribute(self, attribute_name: str, value: str, by_time: float = None):
         if self.data_prepped == False:
@@ -110,44 +173,71 @@ class Hypothesizer:
 
         if by_time != None and by_time < 0:
             raise ValueError(f"by_time must be at least 0. You passed {by_time}.")
-        
-        aggregates = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
 
-        for case in tqdm(self.data["case:concept:name"].unique(), desc = f"Observe NOT EXISTS - {attribute_name} = {value}, by_time = {by_time}"):
-            subset: pd.DataFrame = copy.deepcopy(self.data[["case:concept:name", attribute_name, "time:timestamp"]][self.data["case:concept:name"] == case])
-            case_start_time = subset['time:timestamp'].min()
+        self.schedule('not_exists_attribute', attribute_name = attribute_name, value = value, by_time = by_time)
+
+    def find_not_exists_attribute(self, attribute_name: str, value: str, by_time: float = None) -> pd.DataFrame:
+        if by_time != None:
+            return self.find_not_exists_attribute_sweep(attribute_name, value, [by_time])
+
+        case_start_time, value_observed_mintime, _ = self.get_first_value_times(attribute_name, value)
+        hits = value_observed_mintime.isna().to_numpy()
+        observation = f'{value} not observed'
+        times = case_start_time.to_numpy()[hits]
+
+        # print(f"Observations based on NOT EXISTS for attribute {attribute_name} with value {value} added.")
+        return pd.DataFrame({'case:concept:name' : case_start_time.index[hits], 'observation' : observation, 'time:timestamp' : times})
+
+    def observe_not_exists_attribute_sweep(self, attribute_name: str, value: str, by_times: list):
+        # Same as observe_not_exists_attribute for every threshold in by_times, computed from one pass over the log.
+        if self.data_prepped == False:
+            raise RuntimeError(f"Before the search space can be defined, one must call the 'prepare_event_log()' function.")
 
-            # Determine if the attribute value was observed before the given timing or not
-            # For the subset, set starting time unit to 0
-            mintime = subset['time:timestamp'].min()
-            subset['time:timestamp:reduced'] = subset["time:timestamp"].apply(lambda x: x - mintime)
+        if attribute_name not in self.data.columns:
+            raise ValueError(f"Attribute {attribute_name} is not found in the dataset. Pick one of {self.data.columns}.")
 
-            if by_time != None:
-                # When the attribute value is not observed AND the case has taken longer than the threshold, we can add the observation at the by_time.
-                if value not in subset[[attribute_name]].values and subset['time:timestamp:reduced'].max() > by_time:
-                    temp = pd.DataFrame({'case:concept:name' : [case], 'observation' : [f'{value} not observed within {by_time} {self.time_unit}'], 'time:timestamp' : [case_start_time + by_time]})
-                    aggregates = aggregates.append(temp, ignore_index=True)
+        if len(by_times) == 0 or min(by_times) < 0:
+            raise ValueError(f"by_times must be a non-empty list of values of at least 0. You passed {by_times}.")
 
-                # Also add the observation if the value is observed but (the first occurence happened) after the time threshold
-                if value in subset[[attribute_name]].values:
-                    value_observed_times = subset[subset[attribute_name] == value][["time:timestamp:reduced"]]
-                    value_observed_mintime = value_observed_times['time:timestamp:reduced'].min()
-                    if value_observed_mintime > by_time:
-                        temp = pd.DataFrame({'case:concept:name' : [case], 'observation' : [f'{value} not observed within {by_time} {self.time_unit}'], 'time:timestamp' : [case_start_time + by_time]})
-                        aggregates = aggregates.append(temp, ignore_index=True)
+        self.schedule('not_exists_attribute_sweep', attribute_name = attribute_name, value = value, by_times = list(by_times))
 
-            else:
-                if value not in subset[[attribute_name]].values:
-                    temp = pd.DataFrame({'case:concept:name' : [case], 'observation' : [f'{value} not observed'], 'time:timestamp' : [case_start_time]})
-                    aggregates = aggregates.append(temp, ignore_index=True)
+    def find_not_exists_attribute_sweep(self, attribute_name: str, value: str, by_times: list) -> pd.DataFrame:
+        case_start_time, value_observed_mintime, case_duration = self.get_first_value_times(attribute_name, value)
+        observed = value_observed_mintime.notna().to_numpy()
+        by_times_grid = np.asarray(by_times, dtype=np.float64)[:, np.newaxis]
 
+        # When the attribute value is not observed AND the case has taken longer than the threshold, we can add the observation at the by_time.
+        # Also add the observation if the value is observed but (the first occurence happened) after the time threshold
+        # Rows of the hits matrix are thresholds, columns are cases.
+        hits = (~observed & (case_duration > by_times_grid)) | (observed & (value_observed_mintime.to_numpy() > by_times_grid))
+        grid, cases = np.nonzero(hits)
 
-        if len(aggregates.index) > 0:
-            # Add aggregates to the observations dataframe
-            self.observations = self.observations.append(aggregates, ignore_index=True)
+        observations = np.array([f'{value} not observed within {by_time} {self.time_unit}' for by_time in by_times], dtype=object)
+        return pd.DataFrame({'case:concept:name' : case_start_time.index[cases], 'observation' : observations[grid],
+                             'time:timestamp' : case_start_time.to_numpy()[cases] + by_times_grid[grid, 0]})
 
-        self.arrange_observations()
-        # print(f"Observations based on NOT EXISTS for attribute {attribute_name} with value {value} added.")
+    def get_first_value_times(self, attribute_name: str, value: str):
+        # Per case: the start time, the time of the first occurrence of the value relative to the start (NaN when it was not observed), and the duration.
+        store = self.get_trace_store(by_time=True)
+        relative = self.get_relative_times()
+        case_start_time, case_duration = self.get_case_durations()
+
+        # Events of a case are sorted by time, so the first event with the value in every case is its first occurrence
+        rows = np.flatnonzero(store.get_codes(attribute_name) == store.get_code(attribute_name, value))
+        value_cases, first = np.unique(store.cases[rows], return_index=True)
+        value_observed_mintime = np.full(len(store.case_labels), np.nan)
+        value_observed_mintime[value_cases] = relative[rows[first]]
+        value_observed_mintime = pd.Series(value_observed_mintime, index=store.case_labels)
+
+        return case_start_time, value_observed_mintime, case_duration
+
+    def get_case_durations(self):
+        # Per case, in the order of the trace store: the start time (as a series by case) and the duration, the latest time relative to the start.
+        store = self.get_trace_store(by_time=True)
+        relative = self.get_relative_times()
+        case_duration = np.fmax.reduceat(relative, store.offsets[:-1]) if len(relative) > 0 else np.empty(0)
+
+        return pd.Series(store.get_start_times(), index=store.case_labels), case_duration
 
     def observe_and(self, attribute: str, values: set):
         if self.data_prepped == False:
@@ -159,29 +249,21 @@ class Hypothesizer:
         if not all(value in self.data[attribute].unique() for value in values):
             raise ValueError(f"Not all values of {values} were found in the data. Pick values from {self.data[attribute].unique()}")
 
-        aggregates = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
-
-        for case in tqdm(self.data["case:concept:name"].unique(), desc = f"Observe AND - {attribute}: {values}"):
-            subset: pd.DataFrame = copy.deepcopy(self.data[["case:concept:name", attribute, "time:timestamp"]][self.data["case:concept:name"] == case])
-            subset = subset[subset[attribute].isin(values)].reset_index(drop=True)
-            counters = {i : 0 for i in values}
+        self.schedule('and', attribute = attribute, values = values)
 
-            for i in range(len(subset.index)):
-                time = subset['time:timestamp'][i]
-                counters[subset[attribute][i]] += 1
-                counter_values = [val for key,val in counters.items()]
-                if 0 not in counter_values:
-                    temp = pd.DataFrame({'case:concept:name' : [case], 'observation' : [f"{values} have all occurred"], 'time:timestamp' : [time]})
-                    aggregates = aggregates.append(temp)
-                    for key in counters:
-                        counters[key] -= 1
+    def find_and(self, attribute: str, values: set) -> pd.DataFrame:
+        data = self.get_case_sorted(["case:concept:name", attribute, "time:timestamp"])
+        data = data[data[attribute].isin(values)]
 
-        if len(aggregates.index) > 0:
-            # Add aggregates to the observations dataframe
-            self.observations = self.observations.append(aggregates, ignore_index=True)
-
-        self.arrange_observations()
+        # Running count of every value within the case. Each time the lowest count goes up, all values have occurred (once more).
+        value_codes = pd.Categorical(data[attribute], categories=list(values)).codes
+        counters = pd.DataFrame(np.eye(len(values), dtype=np.int64)[value_codes], index=data.index)
+        counters = counters.groupby(data["case:concept:name"].to_numpy(), sort=False).cumsum().min(axis=1)
+        previous = counters.groupby(data["case:concept:name"].to_numpy(), sort=False).shift(1, fill_value=0)
+        hits = (counters > previous).to_numpy()
 
+        return pd.DataFrame({'case:concept:name' : data["case:concept:name"].to_numpy()[hits], 'observation' : f"{values} have all occurred",
+                                            'time:timestamp' : data['time:timestamp'].to_numpy()[hits]})
 
     def observe_or(self, attribute: str, values: list):
         if self.data_prepped == False:
@@ -192,23 +274,14 @@ class Hypothesizer:
             
         if not all(value in self.data[attribute].unique() for value in values):
             raise ValueError(f"Not all values of {values} were found in the data. Pick values from {self.data[attribute].unique()}")
-        
-        aggregates = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
 
-        for case in tqdm(self.data["case:concept:name"].unique(), desc = f"Observe OR - {attribute}: {values}"):
-            subset: pd.DataFrame = copy.deepcopy(self.data[["case:concept:name", attribute, "time:timestamp"]][self.data["case:concept:name"] == case])
-            subset = subset[subset[attribute].isin(values)].reset_index(drop=True)
+        self.schedule('or', attribute = attribute, values = values)
 
-            subset[attribute] = subset[attribute].apply(lambda x: f"One of {values} detected")
-            subset = subset.rename(columns={attribute : 'observation'})
+    def find_or(self, attribute: str, values: list) -> pd.DataFrame:
+        data = self.data[self.data[attribute].isin(values)]
 
-            aggregates = aggregates.append(subset)
-        
-        if len(aggregates.index) > 0:
-            # Add aggregates to the observations dataframe
-            self.observations = self.observations.append(aggregates, ignore_index=True)
-        
-        self.arrange_observations()
+        return pd.DataFrame({'case:concept:name' : data["case:concept:name"].to_numpy(), 'observation' : f"One of {values} detected",
+                                            'time:timestamp' : data['time:timestamp'].to_numpy()})
 
     def observe_not_exists_activity_resource_combo(self, activity: str, resource: str, by_time: float):
         if self.data_prepped == False:
@@ -220,24 +293,18 @@ class Hypothesizer:
         if self.data_prepped == False:
             raise RuntimeError(f"Before the search space can be defined, one must call the 'prepare_event_log()' function.")
 
-        aggregates = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
+        self.schedule('activity_resource_relations', activities = activities)
 
-        # Make one observation for the activities passed along with the resources that executed them.
-        for case in tqdm(self.data["case:concept:name"].unique(), desc = f"Observe activity-resource relations for {activities}"):
-            subset: pd.DataFrame = copy.deepcopy(self.data[['case:concept:name', 'concept:name', 'org:resource', 'time:timestamp']][self.data['case:concept:name'] == case])
-            subset = subset[subset['concept:name'].isin(activities)]
-            subset = subset.reset_index(drop=True)
+    def find_activity_resource_relations(self, activities: Tuple[str, str]) -> pd.DataFrame:
+        data = self.get_case_sorted(['case:concept:name', 'concept:name', 'org:resource', 'time:timestamp'])
+        data = data[data['concept:name'].isin(activities)]
 
-            subset['concat'] = subset.apply(lambda row: row['concept:name'] + ' by ' + row['org:resource'], axis=1)
-            obs = subset['concat'].str.cat(sep =' - ')
-            aggregates = aggregates.append(
-                            pd.DataFrame({'case:concept:name':[case], 'observation':[obs],
-                            'time:timestamp':[max(subset['time:timestamp'])]}))
+        # Make one observation for the activities passed along with the resources that executed them.
+        concat = (data['concept:name'].astype(object) + ' by ' + data['org:resource'].astype(object)).dropna()
+        times = data.groupby('case:concept:name', sort=False, observed=True)['time:timestamp'].max()
+        obs = concat.groupby(data['case:concept:name'], sort=False, observed=True).agg(' - '.join).reindex(times.index)
 
-        if len(aggregates.index) > 0:
-            # Add aggregates to the observations dataframe
-            self.observations = self.observations.append(aggregates, ignore_index=True)
-        
+        return pd.DataFrame({'case:concept:name' : times.index, 'observation' : obs.to_numpy(), 'time:timestamp' : times.to_numpy()})
 
     def observe_directly_follows(self, activity1: str, activity2: str, negate: bool = False):
         if self.data_prepped == False:
@@ -246,31 +313,30 @@ class Hypothesizer:
         # Act2 must follow Act1 without other activities begin executed. Negate turns it around: add obs when it does NOT follow immediately after.
         if activity1 not in self.data["concept:name"].unique() or activity2 not in self.data["concept:name"].unique():
             raise ValueError(f"Activity {activity1} or activity {activity2} not found in the data. Pick activities from {self.data['concept:name'].unique()}")
-        
-        aggregates = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
-
-        for case in tqdm(self.data["case:concept:name"].unique(), desc = f"Observe directly follows - {activity1} => {activity2}"):
-            subset: pd.DataFrame = copy.deepcopy(self.data[['case:concept:name', 'concept:name', 'time:timestamp']][self.data['case:concept:name'] == case])
-            subset = subset.reset_index(drop=True)
-
-            # For every instance of Act1, check if the next row contains Act2.
-            for i in range(len(subset.index) - 1):
-                if subset['concept:name'][i] == activity1:
-                    if subset['concept:name'][i+1] == activity2 and not negate:
-                        aggregates = aggregates.append(
-                            pd.DataFrame({'case:concept:name':[case], 'observation':[activity2 + ' directly follows ' + activity1],
-                            'time:timestamp':[subset['time:timestamp'][i+1]]}))
-                    if negate and subset['concept:name'][i+1] != activity2:
-                        aggregates = aggregates.append(
-                            pd.DataFrame({'case:concept:name':[case], 'observation':[activity2 + ' did not directly follow ' + activity1],
-                            'time:timestamp':[subset['time:timestamp'][i+1]]}))
 
-        if len(aggregates.index) > 0:
-            # Add aggregates to the observations dataframe
-            self.observations = self.observations.append(aggregates, ignore_index=True)
+        self.schedule('directly_follows', activity1 = activity1, activity2 = activity2, negate = negate)
+
+    def find_directly_follows(self, activity1: str, activity2: str, negate: bool = False) -> pd.DataFrame:
+        store = self.get_trace_store()
+        cases = store.cases
+        activities = store.get_codes('concept:name')
+        code1, code2 = store.get_code('concept:name', activity1), store.get_code('concept:name', activity2)
+
+        # For every instance of Act1, check if the next row (of the same case) contains Act2.
+        has_next = np.append(cases[1:] == cases[:-1], False)
+        next_activity = np.append(activities[1:], -1)
+        next_time = np.append(store.times[1:], np.nan)
+
+        if not negate:
+            hits = has_next & (activities == code1) & (next_activity == code2)
+            observation = activity2 + ' directly follows ' + activity1
+        else:
+            hits = has_next & (activities == code1) & (next_activity != code2)
+            observation = activity2 + ' did not directly follow ' + activity1
 
-        self.arrange_observations()
         # print(f"Observations based on DIRECTLY FOLLOWS for activities {activity1} followed by {activity2} added with negate = {negate}.")
+        return pd.DataFrame({'case:concept:name' : store.case_labels[cases[hits]], 'observation' : observation,
+                             'time:timestamp' : next_time[hits]})
 
     def observe_follows_within(self, activity1: str, activity2: str, margin: float, negative: bool = False):
         if self.data_prepped == False:
@@ -279,38 +345,67 @@ class Hypothesizer:
         # Check if Act2 follows Act1 within a time frame, no matter if other activities were executed in between
         if activity1 not in self.data["concept:name"].unique() or activity2 not in self.data["concept:name"].unique():
             raise ValueError(f"Activity {activity1} or activity {activity2} not found in the data. Pick activities from {self.data['concept:name'].unique()}")
-        
-        aggregates = pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
-
-        for case in tqdm(self.data["case:concept:name"].unique(), desc = f"Observe follows within - {activity1} => {activity2}, margin = {margin}"):
-            subset: pd.DataFrame = copy.deepcopy(self.data[['case:concept:name', 'concept:name', 'time:timestamp']][self.data['case:concept:name'] == case])
-            subset = subset.reset_index(drop=True)
-
-            # Filter the subset to only contain the rows for the entered activities.
-            subset = subset[subset['concept:name'].isin([activity1, activity2])].reset_index(drop = True)
-
-            # For every instance of Act1, check if the next rows contains Act2 and the timing is within the margin.
-            for i in range(len(subset.index) - 1):
-                if subset['concept:name'][i] == activity1:
-                    ref_time = subset['time:timestamp'][i]
-                    for j in range(i+1, len(subset.index)):
-                        if subset['concept:name'][j] == activity2 and subset['time:timestamp'][j] <= ref_time + margin and not negative:
-                            aggregates = aggregates.append(
-                                pd.DataFrame({'case:concept:name':[case], 'observation':[f"{activity2} followed {activity1} within {margin} {self.time_unit}"],
-                                'time:timestamp':[subset['time:timestamp'][j]]}))
-                            break
-                        if subset['concept:name'][j] == activity2 and subset['time:timestamp'][j] >= ref_time + margin and negative:
-                            aggregates = aggregates.append(
-                                pd.DataFrame({'case:concept:name':[case], 'observation':[f"{activity2} did not follow followed {activity1} within {margin} {self.time_unit}"],
-                                'time:timestamp':[subset['time:timestamp'][j]]}))
-                            break
 
-        if len(aggregates.index) > 0:
-            # Add aggregates to the observations dataframe
-            self.observations = self.observations.append(aggregates, ignore_index=True)
+        self.schedule('follows_within', activity1 = activity1, activity2 = activity2, margin = margin, negative = negative)
 
-        self.arrange_observations()
+    def find_follows_within(self, activity1: str, activity2: str, margin: float, negative: bool = False) -> pd.DataFrame:
+        return self.find_follows_within_sweep(activity1, activity2, [margin], negative)
+
+    def observe_follows_within_sweep(self, activity1: str, activity2: str, margins: list, negative: bool = False):
+        # Same as observe_follows_within for every margin in margins, computed from one pass over the log.
+        if self.data_prepped == False:
+            raise RuntimeError(f"Before the search space can be defined, one must call the 'prepare_event_log()' function.")
+
+        if activity1 not in self.data["concept:name"].unique() or activity2 not in self.data["concept:name"].unique():
+            raise ValueError(f"Activity {activity1} or activity {activity2} not found in the data. Pick activities from {self.data['concept:name'].unique()}")
+
+        if len(margins) == 0:
+            raise ValueError(f"margins must be a non-empty list of values.")
+
+        self.schedule('follows_within_sweep', activity1 = activity1, activity2 = activity2, margins = list(margins), negative = negative)
+
+    def find_follows_within_sweep(self, activity1: str, activity2: str, margins: list, negative: bool = False) -> pd.DataFrame:
+        # Only the rows for the entered activities matter, ordered by time within every case.
+        store = self.get_trace_store(by_time=True)
+        code1, code2 = store.get_code('concept:name', activity1), store.get_code('concept:name', activity2)
+        rows = np.flatnonzero(np.isin(store.get_codes('concept:name'), [code1, code2]))
+        cases = store.cases[rows]
+        activities = store.get_codes('concept:name')[rows]
+        times = store.times[rows]
+
+        # For every instance of Act1, look for the first later row containing Act2 ...
+        starts = np.flatnonzero(activities == code1)
+        ends = np.flatnonzero(activities == code2)
+        if len(ends) == 0:
+            starts = starts[:0]
+        candidates = np.searchsorted(ends, starts, side='right')
+
+        # Rows are margins, columns are instances of Act1
+        ref_time = times[starts] + np.asarray(margins, dtype=np.float64)[:, np.newaxis]
+        candidates = np.broadcast_to(candidates, ref_time.shape)
+
+        if not negative:
+            # ... which must have happened within the margin
+            found = candidates < len(ends)
+            candidates = candidates.clip(max=len(ends) - 1)
+            found &= cases[ends[candidates]] == cases[starts]
+            found &= times[ends[candidates]] <= ref_time
+            observations = [f"{activity2} followed {activity1} within {margin} {self.time_unit}" for margin in margins]
+        else:
+            # ... that happened at or after the end of the margin. All margins are searched at once.
+            query_cases = np.broadcast_to(cases[starts], ref_time.shape)
+            after_margin = TraceStore.segmented_searchsorted(cases[ends], times[ends], query_cases.ravel(), ref_time.ravel())
+            candidates = np.maximum(candidates, after_margin.reshape(ref_time.shape))
+            found = candidates < len(ends)
+            candidates = candidates.clip(max=len(ends) - 1)
+            found &= cases[ends[candidates]] == cases[starts]
+            observations = [f"{activity2} did not follow followed {activity1} within {margin} {self.time_unit}" for margin in margins]
+
+        grid, instances = np.nonzero(found)
+        hits = ends[candidates[grid, instances]]
         # print(f"Observations based on FOLLOWS WITHIN for activities {activity1} followed by {activity2} with margin = {margin}.")
+        return pd.DataFrame({'case:concept:name' : store.case_labels[cases[hits]], 'observation' : np.array(observations, dtype=object)[grid],
+                             'time:timestamp' : times[hits]})
 
     def observe_case_delay(self, threshold: float):
         if self.data_prepped == False:
@@ -318,36 +413,29 @@ class Hypothesizer:
             
         if threshold <= 0:
             raise ValueError(f"The threshold value must be higher than 0. You passed {threshold}")
-            
+
+        self.schedule('case_delay', threshold = threshold)
+
+    def find_case_delay(self, threshold: float) -> pd.DataFrame:
         threshold_abs = True if threshold > 1 else False
 
         # Determine the durations of the different traces
-        aggregates = self.data[['case:concept:name', 'time:timestamp']].groupby('case:concept:name').agg({'time:timestamp': ['min', 'max']})
-        aggregates.columns = aggregates.columns.to_flat_index()
-        aggregates = aggregates.assign(diff = lambda x: x[('time:timestamp', 'max')] - x[('time:timestamp', 'min')])
+        case_start_time, case_duration = self.get_case_durations()
 
         if threshold_abs:
             print(f"Absolute threshold set to {threshold}")
         else:
             print(f"Relative threshold set to {threshold * 100}% of max case duration")
-            max_duration = max(aggregates['diff'])
+            max_duration = np.nanmax(case_duration)
             threshold = max_duration * threshold
-        
-        aggregates = aggregates.assign(
-            delayed = lambda x: x['diff'] >= threshold,
-            time = lambda x: x[('time:timestamp', 'min')] + threshold
-        )
-        aggregates = aggregates.reset_index()
-        aggregates = aggregates.rename(columns={'index' : 'case:concept:name', 'delayed' : 'observation'})
-        aggregates = aggregates[['case:concept:name', 'observation', 'time']][aggregates['observation'] == True]
-        aggregates = aggregates.assign(observation = "Case Delayed")
-        aggregates = aggregates.rename(columns={'time' : 'time:timestamp'})
-
-        # Add artificial events to the data
-        self.observations = self.observations.append(aggregates, ignore_index=True)
-        self.arrange_observations()
+
+        delayed = case_duration >= threshold
+        aggregates = pd.DataFrame({'case:concept:name' : case_start_time.index[delayed], 'observation' : "Case Delayed",
+                                   'time:timestamp' : case_start_time.to_numpy()[delayed] + threshold})
 
         print("Effect by delay artificially added.")
+        # Artificial events to add to the data
+        return aggregates
 
     def observe_exists_single_value(self, attribute: str, value: str):
         if self.data_prepped == False:
@@ -359,18 +447,237 @@ class Hypothesizer:
         if not value in self.data[attribute].unique():
             raise ValueError(f"Value {value} was not found in the column {attribute}. Pick values from {self.data[attribute].unique()}")
 
-        subset: pd.DataFrame = copy.deepcopy(self.data[['case:concept:name', attribute, 'time:timestamp']][self.data[attribute] == value])
+        self.schedule('exists_single_value', attribute = attribute, value = value)
+
+    def find_exists_single_value(self, attribute: str, value: str) -> pd.DataFrame:
+        # Boolean indexing already copies the selected rows
+        subset: pd.DataFrame = self.data[['case:concept:name', attribute, 'time:timestamp']][self.data[attribute] == value]
         subset = subset.rename(columns={attribute : 'observation'})
         subset = subset.reset_index(drop=True)
 
-        # Add events to the data
-        # self.observations = self.observations.append(data[["case:concept:name", "observation", "time:timestamp"]], ignore_index=True)
-        self.observations = self.observations.append(subset, ignore_index=True)
-        self.arrange_observations()
-
         print(f"Single {attribute} value observations {value} added.")
+        # Events to add to the data
+        return subset
+
+    def schedule(self, primitive: str, **kwargs):
+        # Run the find_<primitive> function right away, or add it to the plan in lazy mode.
+        if self.lazy:
+            self.plan.append((primitive, kwargs))
+        else:
+            self.add_observations(self.find(primitive, kwargs))
+
+    def find(self, primitive: str, kwargs: dict) -> pd.DataFrame:
+        # Run the find_<primitive> function, reported as an observe_<primitive> stage when instrumented
+        if self.instrumentation == None:
+            return getattr(self, f"find_{primitive}")(**kwargs)
+
+        with self.instrumentation.stage('Hypothesizer', f"observe_{primitive}", parameters = kwargs, rows_in = len(self.data.index)) as event:
+            aggregates = getattr(self, f"find_{primitive}")(**kwargs)
+            event['rows_out'] = len(aggregates.index)
+            event['cases'] = aggregates['case:concept:name'].nunique()
+
+        return aggregates
+
+    def explain(self) -> str:
+        lines = [f"Search space plan for {self.filepath}: {len(self.plan)} step(s) over {len(self.data.index)} events in {self.data['case:concept:name'].nunique()} cases."]
+        for i, (primitive, kwargs) in enumerate(self.plan):
+            arguments = ', '.join(f"{key} = {value}" for key, value in kwargs.items())
+            lines.append(f"  {i + 1}. observe_{primitive}({arguments})")
+
+        return '\n'.join(lines)
+
+    @instrumented('build', lambda self: {'rows_out': len(self.observations.index)})
+    def build(self):
+        # Execute all planned observe_* calls. The log is grouped by case once for all steps, and the results are added and sorted once.
+        if len(self.plan) == 0:
+            return
+
+        if self.workers != None and self.workers > 1:
+            self.build_sharded()
+            return
+
+        aggregates = [Hypothesizer.compact_observations(self.find(primitive, kwargs)) for primitive, kwargs in self.generate_iterator(self.plan, desc = "Building search space")]
+
+        self.plan = []
+        self.add_observations(Hypothesizer.concat_observations(aggregates))
+
+    def build_sharded(self):
+        # Execute all planned observe_* calls, running the case-local steps on shards of the log in self.workers processes (see find_sharded).
+        # Every part of the result is sorted by time, so the parts are merged into the observations instead of sorting everything again.
+        local = [(primitive, kwargs) for primitive, kwargs in self.plan if Hypothesizer.is_case_local(primitive, kwargs)]
+        other = [(primitive, kwargs) for primitive, kwargs in self.plan if not Hypothesizer.is_case_local(primitive, kwargs)]
+
+        parts = [self.observations]
+        if len(local) > 0:
+            parts.append(self.find_sharded(local))
+        if len(other) > 0:
+            parts.append(Hypothesizer.sort_observations(Hypothesizer.concat_observations([self.find(primitive, kwargs) for primitive, kwargs in other])))
+
+        self.plan = []
+        self.observations = Hypothesizer.merge_observations(parts)
+
+    @staticmethod
+    def is_case_local(primitive: str, kwargs: dict) -> bool:
+        # Whether the observations of a step in one case only depend on the events of that case.
+        # A relative case delay threshold depends on the longest case of the whole log.
+        if primitive == 'case_delay':
+            return kwargs['threshold'] > 1
+
+        return True
+
+    def find_sharded(self, plan: list) -> pd.DataFrame:
+        # Split the log into self.workers contiguous ranges of cases (in order of first appearance) with about the same number of events,
+        # and run the steps of the plan on every shard in its own process. Returns the observations of all shards, sorted by time.
+        cases = pd.factorize(self.data['case:concept:name'])[0]
+        events = np.cumsum(np.bincount(cases))
+        bounds = np.searchsorted(events, np.arange(1, self.workers) * len(cases) / self.workers, side='right')
+        shards = np.searchsorted(bounds, cases, side='right')
+
+        order = np.argsort(shards, kind='stable')
+        sizes = np.bincount(shards, minlength=self.workers)
+        tasks = [(self.filepath, self.time_unit, self.data.iloc[rows], plan) for rows in np.split(order, np.cumsum(sizes)[:-1]) if len(rows) > 0]
+
+        with Pool(self.workers) as pool:
+            parts = list(self.generate_iterator(pool.imap(_find_shard, tasks), desc = f"Building search space in {len(tasks)} shards"))
+
+        return Hypothesizer.merge_observations(parts)
+
+    @instrumented('build_out_of_core', lambda self: {'chunks': self.chunks})
+    def build_out_of_core(self, target: str, effects: list = None, memory_limit: float = 1024, chunk_events: int = 100000, causes: list = None) -> IncrementalInference:
+        # Out-of-core execution of the plan on logs larger than memory. The log in self.filepath is read again in chunks of whole cases,
+        # every chunk is searched with the planned steps, and its observations are written to the target folder as one part (see read_parts()).
+        # With effects, the counts of IncrementalInference are summed over the chunks, and it is returned for prima facie testing and epsilon values.
+        # The plan is defined on a log prepared with prepare_event_log() (e.g. on a sample), which is only used to validate the observe_* calls.
+        # XES logs are read trace by trace. CSV logs are read twice: the case column first, to find the last event of every case (see iterate_chunks()).
+        # memory_limit: the memory in MB that a chunk, its observations and the counts of IncrementalInference may take. The chunk size is adapted
+        # to the memory left by the counts after every chunk, starting from chunk_events events. The counts grow with the square of the number of
+        # observations, not with the chunks: a MemoryError is raised when they alone would exceed the limit.
+        # causes: the candidate causes to count, by default every observation. Restricting them keeps the counts small.
+        other = [primitive for primitive, kwargs in self.plan if not Hypothesizer.is_case_local(primitive, kwargs)]
+        if len(other) > 0:
+            raise ValueError(f"Out-of-core execution only supports steps that look within a case. observe_{other[0]} does not.")
+
+        inference = None if effects == None else IncrementalInference(effects, keep_cases = False, causes = causes, memory_limit = memory_limit)
+        os.makedirs(target, exist_ok=True)
+        self.chunks = 0
+
+        for chunk in self.generate_iterator(self.iterate_chunks(chunk_events), desc = "Building search space out-of-core"):
+            hypothesizer = Hypothesizer(self.filepath, pb = False, instrumentation = self.instrumentation)
+            hypothesizer.data = chunk
+            hypothesizer.data_prepped = True
+            hypothesizer.time_unit = self.time_unit
+            hypothesizer.integer_time = self.integer_time
+            if self.case_relative:
+                chunk['time:relative'] = hypothesizer.get_case_relative_times()
+
+            observations = Hypothesizer.sort_observations(Hypothesizer.concat_observations([hypothesizer.find(primitive, kwargs) for primitive, kwargs in self.plan]))
+            FrameCache.write_frame(os.path.join(target, f"part{self.chunks:06d}"), observations)
+            if inference != None:
+                inference.fold(observations)
+            self.chunks += 1
+
+            # Size the next chunk to the memory left by the counts, leaving room for the intermediate frames of the steps
+            size = chunk.memory_usage(deep=True).sum() + observations.memory_usage(deep=True).sum()
+            free = memory_limit - (inference.get_count_memory() if inference != None else 0)
+            self.chunk_events = max(1000, int(free * 2**20 / (Hypothesizer.OUT_OF_CORE_OVERHEAD * size / len(chunk.index))))
+
+        self.plan = []
+        print(f"Search space written to {target} in {self.chunks} part(s).")
+        return inference
+
+    def iterate_chunks(self, chunk_events: int):
+        # Yields the log in self.filepath as prepared data frames of whole cases, of about self.chunk_events events each
+        self.chunk_events = chunk_events
+        time_factor = 1 if self.time_unit == 'seconds' else 60 if self.time_unit == 'minutes' else 3600
+
+        if self.filepath.lower().endswith('.csv'):
+            # The events of a case can be spread over the file (e.g. when it is sorted by time), so the rows of a case are held back
+            # until the row of its last event is read. Only cases that are complete are yielded.
+            last_rows = self.get_case_last_rows(chunk_events)
+            rest = None
+            with pd.read_csv(self.filepath, chunksize=chunk_events) as reader:
+                for chunk in reader:
+                    end = chunk.index[-1]
+                    if self.integer_time:
+                        chunk['time:timestamp'] = Hypothesizer.to_integer_units(chunk['time:timestamp'])
+                    chunk = chunk if rest is None else pd.concat([rest, chunk])
+
+                    complete = (chunk['case:concept:name'].map(last_rows) <= end).to_numpy()
+                    if np.count_nonzero(complete) < self.chunk_events:
+                        rest = chunk
+                        continue
+
+                    yield chunk[complete].reset_index(drop=True)
+                    rest = chunk[~complete]
+                    reader.chunksize = self.chunk_events
+            if rest is not None and len(rest.index) > 0:
+                yield rest.reset_index(drop=True)
+            return
+
+        reader = XESReader(self.filepath, time_factor=time_factor, integer_time=self.integer_time)
+        chunks = reader.iterate_chunks(chunk_events)
+        for chunk in chunks:
+            yield chunk
+            reader.chunk_events = self.chunk_events
+
+    def get_case_last_rows(self, chunk_events: int) -> dict:
+        # The row of the last event of every case in the CSV log in self.filepath, from a first pass over the case column only
+        last_rows = {}
+        with pd.read_csv(self.filepath, usecols=['case:concept:name'], chunksize=chunk_events) as reader:
+            for chunk in reader:
+                cases = chunk['case:concept:name']
+                last = ~cases.duplicated(keep='last').to_numpy()
+                last_rows.update(zip(cases.to_numpy()[last], chunk.index[last]))
+
+        return last_rows
+
+    @staticmethod
+    def read_parts(target: str):
+        # Yields the observation parts written by build_out_of_core(), memory-mapped, e.g. to fold them into an IncrementalInference with other effects
+        for name in sorted(os.listdir(target)):
+            if name.startswith('part') and not name.endswith('.tmp'):
+                yield FrameCache.read_frame(os.path.join(target, name))
+
+    @staticmethod
+    def sort_observations(aggregates: pd.DataFrame) -> pd.DataFrame:
+        # Stable sort on time, so observations at the same time keep the order of the steps
+        order = np.argsort(aggregates['time:timestamp'].to_numpy(), kind='stable')
+        return aggregates.iloc[order].reset_index(drop=True)
+
+    @staticmethod
+    def merge_observations(frames: list) -> pd.DataFrame:
+        # Merge observation tables that are each sorted by time into one sorted, compact table.
+        # The sorted runs are merged two by two; every merge places both runs with one searchsorted, keeping earlier runs first at equal times.
+        frames = [frame for frame in frames if len(frame.index) > 0]
+        runs = []
+        start = 0
+        for frame in frames:
+            runs.append((frame['time:timestamp'].to_numpy(dtype=np.float64), np.arange(start, start + len(frame.index))))
+            start += len(frame.index)
+
+        while len(runs) > 1:
+            merged = []
+            for (times_a, rows_a), (times_b, rows_b) in zip(runs[0::2], runs[1::2]):
+                positions_a = np.arange(len(times_a)) + np.searchsorted(times_b, times_a, side='left')
+                positions_b = np.arange(len(times_b)) + np.searchsorted(times_a, times_b, side='right')
+                times = np.empty(len(times_a) + len(times_b))
+                rows = np.empty(len(times), dtype=np.int64)
+                times[positions_a], rows[positions_a] = times_a, rows_a
+                times[positions_b], rows[positions_b] = times_b, rows_b
+                merged.append((times, rows))
+            if len(runs) % 2 == 1:
+                merged.append(runs[-1])
+            runs = merged
+
+        observations = Hypothesizer.concat_observations(frames)
+        if len(runs) == 0:
+            return observations
+
+        return observations.iloc[runs[0][1]].reset_index(drop=True)
 
     def filter_search_space(self, threshold: float):
+        self.build()
+
         # What to filter out?
         ### - Observations which can be mutually exclusive, like idling times between two specific activities (not supported yet)
         ### - Observations which are only made in less than [threshold]% of the cases
@@ -386,18 +693,119 @@ class Hypothesizer:
 
         print(f"Observations filtered based on minimum frequency of {threshold * 100}%")
 
+    def add_observations(self, aggregates: pd.DataFrame):
+        if len(aggregates.index) > 0:
+            # Add aggregates to the observations dataframe
+            self.observations = Hypothesizer.concat_observations([self.observations, aggregates])
+
+        self.arrange_observations()
+
+    @staticmethod
+    def compact_observations(aggregates: pd.DataFrame) -> pd.DataFrame:
+        # Observations and case IDs are stored as categoricals: integer codes per row plus one dictionary of labels,
+        # instead of a (repeated) Python string per row. The labels are only decoded when exporting to CSV.
+        columns = {}
+        for column in ['case:concept:name', 'observation']:
+            values = aggregates[column]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype('category')
+            # Object categories, so that dictionaries of text and numeric labels can be merged
+            columns[column] = pd.Categorical.from_codes(values.cat.codes, categories=values.cat.categories.astype(object))
+        columns['time:timestamp'] = aggregates['time:timestamp'].to_numpy()
+
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def concat_observations(frames: list) -> pd.DataFrame:
+        # Concatenate observation tables into one compact table, merging the label dictionaries
+        frames = [Hypothesizer.compact_observations(frame) for frame in frames if len(frame.index) > 0]
+        if len(frames) == 0:
+            return pd.DataFrame(columns=["case:concept:name", "observation", "time:timestamp"])
+
+        columns = {column: union_categoricals([frame[column].array for frame in frames]) for column in ['case:concept:name', 'observation']}
+        columns['time:timestamp'] = np.concatenate([frame['time:timestamp'].to_numpy() for frame in frames])
+
+        return pd.DataFrame(columns)
+
+    def get_trace_store(self, by_time: bool = False) -> TraceStore:
+        # The log grouped by case (in order of first appearance), keeping the order of the events within every case, or sorting them by time.
+        # It is built once and shared by all steps, until another log is prepared.
+        if by_time not in self.trace_stores:
+            self.trace_stores[by_time] = TraceStore(self.data, by_time)
+
+        return self.trace_stores[by_time]
+
+    def get_case_relative_times(self) -> np.ndarray:
+        # The time of every event since the first event of its case, in the order of the log
+        relative = self.get_trace_store(by_time=True).to_frame_order(self.get_relative_times())
+        if self.integer_time:
+            relative = relative.astype(np.int64)
+
+        return relative
+
+    def get_relative_times(self) -> np.ndarray:
+        # The time of every event since the first event of its case, in the order of the trace store sorted by time.
+        # Read from the column 'time:relative' when the log was prepared with case_relative, computed otherwise.
+        store = self.get_trace_store(by_time=True)
+        if 'time:relative' in self.data.columns:
+            return self.data['time:relative'].to_numpy(dtype=np.float64)[store.order]
+
+        return store.times - np.repeat(store.get_start_times(), np.diff(store.offsets))
+
+    @staticmethod
+    def to_integer_units(times: pd.Series) -> np.ndarray:
+        # Whole time units (rounded down) of time units given as numbers
+        if times.isna().any():
+            raise ValueError(f"Integer time units require a timestamp on every event. {times.isna().sum()} events have none.")
+
+        return np.floor(times.to_numpy(dtype=np.float64)).astype(np.int64)
+
+    def get_case_sorted(self, columns: list, by_time: bool = False) -> pd.DataFrame:
+        # The given columns of the events, in the order of the trace store
+        return self.data[columns].iloc[self.get_trace_store(by_time).order]
+
     def arrange_observations(self):
+        # Merged observations (see build_sharded) are already in order
+        if self.observations['time:timestamp'].is_monotonic_increasing:
+            return
+
         self.observations = self.observations.sort_values('time:timestamp', ascending=True).reset_index(drop=True)
 
     def filter_observations_NaN(self):
+        self.build()
         self.observations = self.observations[self.observations['observation'].notnull()]
 
     def export_data_to_csv(self, path: str):
         self.data.to_csv(path, index=False)
 
     def export_observations_to_csv(self, path: str):
+        self.build()
         self.arrange_observations()
         self.observations.to_csv(path, index=False)
 
+    @instrumented('export_observations', lambda self: {'rows_out': len(self.observations.index)})
+    def export_observations(self, path: str):
+        # Binary columnar export (see FrameCache), which Inference opens memory-mapped without parsing.
+        self.build()
+        self.arrange_observations()
+        FrameCache.write_frame(path, self.observations.reset_index(drop=True))
+
+    def generate_iterator(self, iter, desc = None):
+        # Progress bar with description, unless disabled in the initialisation of the instance
+        if not self.pb:
+            return iter
+        else:
+            return tqdm(iter, desc = desc)
+
     def __str__(self) -> str:
-        return self.observations.__str__()
\ No newline at end of file
+        return self.observations.__str__()
+
+def _find_shard(task) -> pd.DataFrame:
+    # Run the steps of a plan on one shard of the log in a worker process of Hypothesizer.find_sharded()
+    filepath, time_unit, data, plan = task
+    hypothesizer = Hypothesizer(filepath, pb = False)
+    hypothesizer.data = data
+    hypothesizer.data_prepped = True
+    hypothesizer.time_unit = time_unit
+
+    return Hypothesizer.sort_observations(Hypothesizer.concat_observations([hypothesizer.find(primitive, kwargs) for primitive, kwargs in plan]))
@@ -0,0 +1,271 @@
+from collections import deque
+
+import pandas as pd
+import numpy as np
+
+from Inference import Inference
+
+class IncrementalInference:
+    """
+    Keeps the prima facie causes and epsilon values of a set of effects up to date over a stream of closed cases.
+
+    Instead of the event data, only the sufficient statistics of Inference are kept, over all observations seen so far:
+        c_trues[c]:          number of cases containing c
+        cx[c, x]:            number of cases containing c and x
+    and per effect e:
+        before[e][c]:        number of cases where c occurred before the last e (c_and_e of test_cause_effect_pair)
+        cxe[e][c, x]:        number of cases where c and x occurred before the last e
+        c_xe[e][c, x]:       number of cases containing c where x occurred before the last e
+    New cases are folded into these counts, after which prima facie conditions and epsilon values are
+    recomputed in O(k²) for k causes, without revisiting old cases. The results equal those of Inference
+    run on all cases folded in so far.
+
+    With a *window*, only the most recent cases are counted: older cases are retired by subtracting their counts.
+
+    The counts are sums over cases, so instances that counted different cases can be merged (see merge), e.g. per chunk of a log.
+
+    The count matrices take O(k²) memory for k observations. With *causes*, only the candidate causes and the effects are counted.
+    With a *memory_limit*, the number of cases turned into matrices at once is derived from the memory left by the counts,
+    and a MemoryError is raised before the counts would outgrow the limit.
+    """
+
+    def __init__(self, effects, window = None, block_size = 4096, keep_cases = True, causes = None, memory_limit = None) -> None:
+        """
+        Parameters:
+            effects: the list of effects to keep the causes of.
+            window: the number of most recent cases to count. By default, all cases are counted.
+            block_size: the number of cases turned into matrices at once.
+            keep_cases: keep the encoded cases, so they can be retired later. Without a window, cases can be dropped
+                        once counted, so that memory does not grow with the number of cases.
+            causes: the candidate causes to count. By default, every observation. Other observations are ignored.
+            memory_limit: the memory in MB that the counts and a block of cases may take. By default, there is no limit.
+        """
+        self.effects = list(effects)
+        self.window = window
+        self.block_size = block_size
+        self.keep_cases = keep_cases or window != None
+        self.causes = None if causes == None else {str(cause) for cause in causes} | {str(effect) for effect in self.effects}
+        self.memory_limit = memory_limit
+
+        self.alphabet = []
+        self.obs_lookup = {}
+        self.traces = 0
+
+        self.c_trues = np.zeros(0, dtype=np.int64)
+        self.cx = np.zeros((0, 0), dtype=np.int64)
+        self.before = [np.zeros(0, dtype=np.int64) for _ in self.effects]
+        self.cxe = [np.zeros((0, 0), dtype=np.int64) for _ in self.effects]
+        self.c_xe = [np.zeros((0, 0), dtype=np.int64) for _ in self.effects]
+
+        # Encoded cases that are still counted, oldest first: (observation codes, first times, last times)
+        self.cases = deque()
+        self.prima_facie = {}
+
+    def fold(self, frame: pd.DataFrame) -> None:
+        """
+        Add closed cases to the counts. Every case must be complete: a case ID that was folded before counts as a new case.
+
+        Parameters:
+            frame: observations with columns "case:concept:name", "observation" and "time:timestamp".
+        """
+        records = self.encode(frame)
+        self.update(records, 1)
+        if self.keep_cases:
+            self.cases.extend(records)
+
+        if self.window != None and len(self.cases) > self.window:
+            self.retire(len(self.cases) - self.window)
+
+    def merge(self, other) -> None:
+        """
+        Add the counts of another instance, which counted other cases for the same effects.
+        Neither instance may have a window, as the order of their cases is unknown.
+        """
+        if self.window != None or other.window != None:
+            raise ValueError("Only instances without a window can be merged.")
+
+        if [str(effect) for effect in self.effects] != [str(effect) for effect in other.effects]:
+            raise ValueError(f"Only instances with the same effects can be merged. You passed {other.effects} for {self.effects}.")
+
+        self.add_observations(other.alphabet)
+        codes = np.array([self.obs_lookup[obs] for obs in other.alphabet], dtype=np.int64)
+        pairs = np.ix_(codes, codes)
+
+        self.traces += other.traces
+        self.c_trues[codes] += other.c_trues
+        self.cx[pairs] += other.cx
+        for j in range(len(self.effects)):
+            self.before[j][codes] += other.before[j]
+            self.cxe[j][pairs] += other.cxe[j]
+            self.c_xe[j][pairs] += other.c_xe[j]
+
+        if self.keep_cases:
+            self.cases.extend(other.cases)
+
+    def retire(self, n) -> None:
+        """
+        Remove the *n* oldest cases from the counts.
+        """
+        records = [self.cases.popleft() for _ in range(min(n, len(self.cases)))]
+        self.update(records, -1)
+
+    def encode(self, frame: pd.DataFrame) -> list:
+        """
+        Encode cases as (observation codes, first times, last times), in order of first appearance.
+        """
+        frame = frame[frame['observation'].notna()]
+        if self.causes != None:
+            frame = frame[frame['observation'].astype(str).isin(self.causes)]
+        if len(frame.index) == 0:
+            return []
+        self.add_observations(pd.unique(frame['observation']))
+
+        codes = frame['observation'].map(lambda obs: self.obs_lookup.get(str(obs), -1)).to_numpy(dtype=np.int64)
+        case_codes = pd.factorize(frame['case:concept:name'])[0]
+        pairs = pd.DataFrame({'case': case_codes, 'obs': codes, 'time': frame['time:timestamp'].to_numpy(dtype=np.float64)})
+        pairs = pairs.groupby(['case', 'obs'], sort=True)['time'].agg(['min', 'max'])
+
+        cases = pairs.index.get_level_values('case').to_numpy()
+        obs = pairs.index.get_level_values('obs').to_numpy()
+        first, last = pairs['min'].to_numpy(), pairs['max'].to_numpy()
+        bounds = np.searchsorted(cases, np.arange(case_codes.max() + 2))
+
+        return [(obs[i:j], first[i:j], last[i:j]) for i, j in zip(bounds[:-1], bounds[1:])]
+
+    def add_observations(self, observations) -> None:
+        """
+        Extend the alphabet and grow the count matrices with zeros for new observations.
+        """
+        new = list(dict.fromkeys(str(obs) for obs in observations if str(obs) not in self.obs_lookup))
+        m = len(self.alphabet) + len(new)
+        if self.memory_limit != None and self.get_count_memory(m) + self.get_block_memory(m, 0) > self.memory_limit:
+            raise MemoryError(f"The counts of {m} observations and {len(self.effects)} effects take about {round(self.get_count_memory(m), 3)} MB, "
+                              f"more than the memory limit of {self.memory_limit} MB. Restrict the candidate causes or raise the limit.")
+
+        for obs in new:
+            self.obs_lookup[obs] = len(self.alphabet)
+            self.alphabet.append(obs)
+
+        grow = len(self.alphabet) - len(self.c_trues)
+        if grow > 0:
+            self.c_trues = np.pad(self.c_trues, (0, grow))
+            self.cx = np.pad(self.cx, (0, grow))
+            self.before = [np.pad(counts, (0, grow)) for counts in self.before]
+            self.cxe = [np.pad(counts, (0, grow)) for counts in self.cxe]
+            self.c_xe = [np.pad(counts, (0, grow)) for counts in self.c_xe]
+
+    def get_count_memory(self, m = None) -> float:
+        """
+        The memory in MB of the count matrices of *m* observations (by default, the current alphabet).
+        """
+        m = len(self.alphabet) if m == None else m
+        return 8 * m * (m + 1) * (1 + 2 * len(self.effects)) / 2**20
+
+    @staticmethod
+    def get_block_memory(m, n) -> float:
+        """
+        The memory in MB that update() takes for a block of *n* cases over *m* observations:
+        the case × observation matrices, and the m × m products added to the counts.
+        """
+        return (24 * n * m + 12 * m * m) / 2**20
+
+    def get_block_size(self) -> int:
+        """
+        The number of cases turned into matrices at once: *block_size*, or less to stay within the memory limit.
+        """
+        if self.memory_limit == None:
+            return self.block_size
+
+        m = max(1, len(self.alphabet))
+        free = self.memory_limit - self.get_count_memory() - self.get_block_memory(m, 0)
+        return max(1, min(self.block_size, int(free * 2**20 / (24 * m))))
+
+    def update(self, records: list, sign: int) -> None:
+        """
+        Add (sign = 1) or subtract (sign = -1) the counts of encoded cases.
+        """
+        m = len(self.alphabet)
+        # An effect that was never observed keeps zero counts
+        effect_codes = [self.obs_lookup.get(str(effect), -1) for effect in self.effects]
+
+        block_size = self.get_block_size()
+        for start in range(0, len(records), block_size):
+            block = records[start:start + block_size]
+            n = len(block)
+            rows = np.repeat(np.arange(n), [len(codes) for codes, _, _ in block])
+            codes = np.concatenate([codes for codes, _, _ in block])
+            first_times = np.concatenate([first for _, first, _ in block])
+            last_times = np.concatenate([last for _, _, last in block])
+
+            # Case × observation matrix of earliest occurrence times
+            first = np.full((n, m), np.inf)
+            first[rows, codes] = first_times
+            h = np.isfinite(first).astype(np.float32)
+
+            self.traces += sign * n
+            self.c_trues += sign * h.sum(axis = 0).astype(np.int64)
+            self.cx += sign * (h.T @ h).astype(np.int64)
+
+            for j, code in enumerate(effect_codes):
+                e_last = np.full(n, np.nan)
+                e_last[rows[codes == code]] = last_times[codes == code]
+                o = (first <= e_last[:, np.newaxis]).astype(np.float32)
+
+                self.before[j] += sign * o.sum(axis = 0).astype(np.int64)
+                self.cxe[j] += sign * (o.T @ o).astype(np.int64)
+                self.c_xe[j] += sign * (h.T @ o).astype(np.int64)
+
+    def test_for_prima_facie(self, causes = None) -> None:
+        """
+        Recompute the prima facie causes of every effect from the counts (see Inference.is_prima_facie).
+
+        Parameters:
+            causes: the candidate causes. By default, every observation seen so far.
+        """
+        causes = self.alphabet if causes == None else [str(cause) for cause in causes]
+        codes = np.array([self.obs_lookup.get(cause, -1) for cause in causes], dtype=np.int64)
+        known = codes >= 0
+
+        self.prima_facie = {}
+        for j, effect in enumerate(self.effects):
+            c_and_e, c_trues = np.zeros(len(codes)), np.zeros(len(codes))
+            c_and_e[known] = self.before[j][codes[known]]
+            c_trues[known] = self.c_trues[codes[known]]
+            e_trues = self.c_trues[self.obs_lookup[str(effect)]] if str(effect) in self.obs_lookup else 0
+
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                prima_facie = (c_trues > 0) & (c_and_e / c_trues > e_trues / self.traces)
+
+            found = [cause for cause, pf in zip(causes, prima_facie) if pf and cause != str(effect)]
+            if len(found) > 0:
+                self.prima_facie[effect] = found
+
+    def get_epsilon_averages(self, effect) -> dict:
+        """
+        Epsilon values of all prima facie causes of an effect, from the counts (see Inference.get_epsilon_averages).
+        """
+        causes = self.prima_facie[effect]
+        k = len(causes)
+        if k < 2:
+            return({cause: None for cause in causes})
+
+        j = self.effects.index(effect)
+        codes = np.array([self.obs_lookup[cause] for cause in causes])
+        pairs = np.ix_(codes, codes)
+        eps_x = Inference.sum_epsilons(self.cx[pairs].astype(np.float64), self.cxe[j][pairs].astype(np.float64), self.c_xe[j][pairs].astype(np.float64),
+                                       self.c_trues[codes].astype(np.float64), self.before[j][codes].astype(np.float64))
+
+        return({cause: eps_x[i] / (k - 1) for i, cause in enumerate(causes)})
+
+    def calculate_average_epsilons(self, target_file) -> None:
+        """
+        Write the epsilon values of all prima facie causes, in the format of Inference.calculate_average_epsilons.
+        """
+        with open(target_file, mode='w') as f:
+            f.write(f"cause,effect,epsilon")
+
+            for effect in self.prima_facie:
+                epsilons = self.get_epsilon_averages(effect)
+                for cause in self.prima_facie[effect]:
+                    f.write("\n")
+                    f.write(f"{cause},{effect},{epsilons[cause]}")
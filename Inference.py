@@ -1,13 +1,39 @@
 from typing import Tuple
+from collections.abc import Mapping
+from contextlib import contextmanager
+from heapq import heappush, heapreplace
+from multiprocessing import Pool
+import os
+import time
+import tempfile
 import pandas as pd
 import numpy as np
 import tqdm
-import copy
+
+from FrameCache import FrameCache
+from Checkpoint import Checkpoint
+from TraceStore import TraceStore
+import Kernels
+from Significance import compute_q
+from Instrumentation import instrumented
+
+# Instance used by the worker processes of Inference.worker_pool()
+_worker = None
+
+# Number of set bits of every byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1).astype(np.uint8)
 
 class Inference:
 
-    def __init__(self, file_path, pb) -> None:
-        self.source = pd.read_csv(file_path)
+    def __init__(self, file_path, pb, instrumentation = None) -> None:
+        # instrumentation: an Instrumentation sink to report the stages of the inference to, see Instrumentation.py
+        self.instrumentation = instrumentation
+
+        # A search space exported with Hypothesizer.export_observations() is a folder, which is memory-mapped instead of parsed
+        if os.path.isdir(file_path):
+            self.source = FrameCache.read_frame(file_path)
+        else:
+            self.source = pd.read_csv(file_path)
         self.pb = pb
         
         self.dict_by_obs = {}
@@ -16,11 +42,38 @@ class Inference:
         self.traces = 0
         self.max_time = 0
 
+        # Observations grouped by case and sorted by time, and the per (observation, case) index, grouped by observation. See build_index().
+        self.trace_store = None
+        self.event_obs = None
+        self.event_cases = None
+        self.event_times = None
+        self.obs_labels = None
+        self.obs_lookup = {}
+        self.case_labels = None
+        self.obs_offsets = None
+        self.obs_cases = None
+        self.obs_first = None
+        self.obs_last = None
+
+        # Packed case bitsets of the observations made in many cases. See build_bitsets().
+        self.bitsets = None
+        self.bitset_rows = None
+
+        # All events grouped by observation and sorted by case and time, for windowed hypotheses. See build_event_index().
+        self.event_offsets = None
+        self.event_sorted_cases = None
+        self.event_sorted_times = None
+        self.effect_keys = {}
+
         self.hypotheses = []
+        self.windowed = False
+        self.pruned = {}
         self.prima_facie = {}
+        self.epsilons = []
 
         self.populate_vars()
 
+    @instrumented('populate_vars', lambda self: {'rows_in': self.events, 'cases': self.traces, 'observations': len(self.alphabet)})
     def populate_vars(self) -> None:
         """
         Read time series data from file and get *dict_by_obs*, and *alphabet*.
@@ -28,79 +81,441 @@ class Inference:
         self.events = len(self.source.index)
         self.traces = len(self.source['case:concept:name'].unique())
 
-        for index, row in self.generate_iterator(self.source.iterrows(), "Processing time series data"):
-            case, obs, t = row
+        # Encode the observations and cases, see build_index()
+        self.build_index()
 
-            # Populate dict_by_obs
-            # Overview of all timestamps by observation
-            # (In case you need to know when specific observations were made)
-            if obs not in self.dict_by_obs:
-                self.dict_by_obs[obs] = {case: [t]}
-            else:
-                if case in self.dict_by_obs[obs]:
-                    self.dict_by_obs[obs][case].append(t)
-                else:
-                    self.dict_by_obs[obs][case] = [t]
-
-            # Populate the alphabet
-            # Overview of all different observations made (states)
-            if obs not in self.alphabet:
-                self.alphabet.append(str(obs))
-            
-            # Set max time
+        # Populate the alphabet
+        # Overview of all different observations made (states), in order of first appearance
+        self.alphabet = [str(obs) for obs in self.obs_labels]
+
+        # Populate dict_by_obs
+        # Overview of all timestamps by observation
+        # (In case you need to know when specific observations were made)
+        # The events are passed in the order of the source, so cases and timestamps keep their order of appearance
+        store = self.trace_store
+        self.dict_by_obs = ObservationTimes(self.obs_labels, self.case_labels, store.to_frame_order(self.event_obs), store.to_frame_order(self.event_cases), store.to_frame_order(self.event_times))
+
+        # Set max time
+        if self.events > 0:
             self.max_time = self.source.iloc[-1,2]
 
-    def generate_hypotheses_for_effects(self, causes, effects) -> None:
+    def build_index(self) -> None:
+        """
+        Encode observations and cases as integers and store the first and last timestamp of every (observation, case) pair.
+        The pairs are grouped by observation and sorted by case: the entries of observation code o are found at
+        obs_offsets[o]:obs_offsets[o + 1] in *obs_cases*, *obs_first* and *obs_last*.
+        The events come from the trace store, in which they are already sorted by case and time, so one stable sort on the observation
+        groups them by observation, case and time.
+        """
+        self.trace_store = TraceStore(self.source, by_time=True)
+        self.event_obs, self.event_cases, self.event_times = self.trace_store.get_codes('observation'), self.trace_store.cases, self.trace_store.times
+        self.obs_labels = self.trace_store.labels['observation']
+        self.obs_lookup = {str(obs): code for code, obs in enumerate(self.obs_labels)}
+        self.case_labels = self.trace_store.case_labels
+
+        # Observations without a value (code -1) never match a hypothesis
+        order = self.get_event_order()
+        obs, cases, times = self.event_obs[order], self.event_cases[order], self.event_times[order]
+        pair_starts = np.flatnonzero(np.append(True, (obs[1:] != obs[:-1]) | (cases[1:] != cases[:-1]))) if len(order) > 0 else order
+
+        self.obs_cases = cases[pair_starts]
+        self.obs_offsets = np.searchsorted(obs[pair_starts], np.arange(len(self.obs_labels) + 1))
+        # Timestamps that are NaN are skipped, as by a pandas min and max
+        self.obs_first = np.fmin.reduceat(times, pair_starts) if len(order) > 0 else np.empty(0)
+        self.obs_last = np.fmax.reduceat(times, pair_starts) if len(order) > 0 else np.empty(0)
+
+    def get_event_order(self) -> np.ndarray:
+        """
+        The positions of the events with an observation in the trace store, sorted by observation, case and time.
+        """
+        valid = np.flatnonzero(self.event_obs >= 0)
+        return(valid[np.argsort(self.event_obs[valid], kind='stable')])
+
+    def get_entries(self, obs) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the cases in which an observation was made, together with its first and last timestamp in each of those cases.
+        """
+        code = self.obs_lookup.get(str(obs))
+        if code is None:
+            return(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+
+        start, end = self.obs_offsets[code], self.obs_offsets[code + 1]
+        return(self.obs_cases[start:end], self.obs_first[start:end], self.obs_last[start:end])
+
+    def build_bitsets(self, block_size = 1024) -> None:
+        """
+        Store the cases of every dense observation as a packed bitset (np.packbits order): row bitset_rows[o] of *bitsets*, or -1 for sparse observations.
+        An observation is dense when its bitset takes no more memory than its case codes in the index (at least 1 in 64 cases),
+        so the bitsets never take more memory than the index itself. Sparse observations keep using their sorted case codes.
+        """
+        counts = np.diff(self.obs_offsets)
+        n_bytes = (len(self.case_labels) + 7) // 8
+        dense = np.flatnonzero(counts * 64 >= len(self.case_labels))
+
+        self.bitset_rows = np.full(len(counts), -1, dtype=np.int64)
+        self.bitset_rows[dense] = np.arange(len(dense))
+        self.bitsets = np.zeros((len(dense), n_bytes), dtype=np.uint8)
+
+        for start in range(0, len(dense), block_size):
+            codes = dense[start:start + block_size]
+            rows, entries = self.get_entry_indices(codes)
+            cases = self.obs_cases[entries]
+            # Cases are unique per observation, so adding the bits of a byte equals or-ing them
+            flat = rows * n_bytes + (cases >> 3)
+            bits = np.bincount(flat, weights=np.right_shift(0x80, cases & 7), minlength=len(codes) * n_bytes)
+            self.bitsets[start:start + len(codes)] = bits.reshape(len(codes), n_bytes).astype(np.uint8)
+
+    def get_entry_indices(self, codes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the positions in the index of all entries of the observation codes, together with the position in *codes* each entry belongs to.
+        """
+        starts = self.obs_offsets[codes]
+        lengths = self.obs_offsets[np.asarray(codes) + 1] - starts
+        owners = np.repeat(np.arange(len(lengths)), lengths)
+        entries = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+
+        return(owners, entries)
+
+    @staticmethod
+    def popcount(bits, axis = None):
+        """
+        Count the set bits of a packed bitset, over all bytes or along *axis*.
+        """
+        return(POPCOUNT[bits].sum(axis=axis, dtype=np.int64))
+
+    def build_event_index(self) -> None:
+        """
+        Sort all events by observation, case and time: the events of observation code o are found at
+        event_offsets[o]:event_offsets[o + 1] in *event_sorted_cases* and *event_sorted_times*.
+        Only needed for windowed hypotheses, so it is built on first use.
+        """
+        order = self.get_event_order()
+
+        self.event_sorted_cases = self.event_cases[order]
+        self.event_sorted_times = self.event_times[order]
+        self.event_offsets = np.searchsorted(self.event_obs[order], np.arange(len(self.obs_labels) + 1))
+
+    def get_events(self, obs) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the case and timestamp of every event of an observation, sorted by case and time.
+        """
+        if self.event_offsets is None:
+            self.build_event_index()
+
+        code = self.obs_lookup.get(str(obs))
+        if code is None:
+            return(np.empty(0, dtype=np.int64), np.empty(0))
+
+        start, end = self.event_offsets[code], self.event_offsets[code + 1]
+        return(self.event_sorted_cases[start:end], self.event_sorted_times[start:end])
+
+    def leads_to(self, cause, effect, windows) -> list:
+        """
+        For every time window (r, s), get the sorted case codes in which the cause leads to the effect within the window:
+        some occurrence of the effect lies in [t + r, t + s] for some occurrence t of the cause.
+        The window (0, inf) is the untimed relation of test_cause_effect_pair.
+
+        The effect events are encoded once as (case, rank of time) keys, after which each window takes one binary search per cause event.
+        """
+        c_cases, c_times = self.get_events(cause)
+        e_cases, e_times = self.get_events(effect)
+        if len(c_cases) == 0 or len(e_cases) == 0:
+            return([np.empty(0, dtype=np.int64) for _ in windows])
+
+        unique_times, scale, keys = self.get_effect_keys(effect)
+
+        cases = []
+        for r, s in windows:
+            # First effect event in the same case at or after t + r
+            pos = np.searchsorted(keys, c_cases * scale + np.searchsorted(unique_times, c_times + r), side='left')
+            found = pos < len(keys)
+            pos = pos.clip(max=len(keys) - 1)
+            hit = found & (e_cases[pos] == c_cases) & (e_times[pos] <= c_times + s)
+            cases.append(np.unique(c_cases[hit]))
+
+        return(cases)
+
+    def get_effect_keys(self, effect) -> Tuple[np.ndarray, int, np.ndarray]:
+        """
+        Encode the events of an effect as (case, exact rank of time) pairs in one sortable integer, see leads_to().
+        The encoding is kept, so all causes tested against the effect share it.
+        """
+        if effect not in self.effect_keys:
+            self.effect_keys[effect] = TraceStore.rank_keys(*self.get_events(effect))
+
+        return(self.effect_keys[effect])
+
+    @instrumented('generate_hypotheses', lambda self: {'hypotheses': len(self.hypotheses), 'pruned': dict(self.pruned)})
+    def generate_hypotheses_for_effects(self, causes, effects, windows = None, min_support = None, prune = False) -> None:
         """
         Generates hypotheses for all effects. A hypothesis is of form:
             (cause, effect)
+        or, with time windows, of form:
+            (cause, effect, (r, s)): the cause leads to the effect within r to s time units.
 
         Parameters:
             causes:     a variable or set of variables
             effects:   a list of possible effects
+            windows:    a list of time windows (r, s) to test every cause with.
+            min_support: drop causes that occur in less than this fraction of the traces.
+            prune:      drop hypotheses that cannot be prima facie causes before testing them (see prune_hypotheses).
         """
-        self.hypotheses = [(cause, effect) for effect in effects for cause in causes if cause != effect]
+        if windows == None:
+            self.windowed = False
+            self.hypotheses = [(cause, effect) for effect in effects for cause in causes if cause != effect]
+        else:
+            self.windowed = True
+            self.hypotheses = [(cause, effect, tuple(window)) for effect in effects for cause in causes if cause != effect for window in windows]
+
+        if min_support != None or prune:
+            self.prune_hypotheses(min_support, prune)
+
+    def prune_hypotheses(self, min_support = None, prune = True) -> None:
+        """
+        Drop hypotheses using only the number of traces and the time span of every observation:
+            min_support:  the cause occurs in less than *min_support* of the traces.
+            upper_bound:  c_and_e <= min(c_trues, e_trues), so P(e|c) is at most min(c_trues, e_trues) / c_trues.
+                          When that is not above P(e), c cannot be a prima facie cause of e.
+            after_effect: the earliest c (plus r for a window) comes after the latest e in the log, so c never precedes e.
+        Only min_support changes the results: the other prunes only drop hypotheses that would fail test_for_prima_facie.
+        The number of hypotheses dropped by each prune is stored in *pruned*.
+        """
+        counts = np.diff(self.obs_offsets)
+        if len(counts) > 0:
+            first = np.fmin.reduceat(self.obs_first, self.obs_offsets[:-1])
+            last = np.fmax.reduceat(self.obs_last, self.obs_offsets[:-1])
+        else:
+            first, last = np.empty(0), np.empty(0)
+
+        # Unknown observations get code -1, pointing at a padding entry that never occurs
+        counts, first, last = np.append(counts, 0), np.append(first, np.nan), np.append(last, np.nan)
+        c_codes = np.array([self.obs_lookup.get(str(h[0]), -1) for h in self.hypotheses], dtype=np.int64)
+        e_codes = np.array([self.obs_lookup.get(str(h[1]), -1) for h in self.hypotheses], dtype=np.int64)
+        r = np.array([h[2][0] if self.windowed else 0 for h in self.hypotheses], dtype=np.float64)
+        c_trues, e_trues = counts[c_codes], counts[e_codes]
+
+        drop = np.zeros(len(self.hypotheses), dtype=np.int64)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            checks = [
+                ('min_support', c_trues < min_support * self.traces if min_support != None else np.zeros(len(drop), dtype=bool)),
+                ('upper_bound', prune & ((c_trues == 0) | ~(np.minimum(c_trues, e_trues) / c_trues > e_trues / self.traces))),
+                ('after_effect', prune & (first[c_codes] + r > last[e_codes])),
+            ]
+        # Every hypothesis is counted under the first prune that drops it
+        for i, (name, dropped) in reversed(list(enumerate(checks))):
+            drop[dropped] = i + 1
 
-    def test_for_prima_facie(self) -> None:
+        self.pruned = {name: int(np.count_nonzero(drop == i + 1)) for i, (name, _) in enumerate(checks)}
+        print(f"Hypotheses pruned: {', '.join(f'{n} by {name}' for name, n in self.pruned.items())}. {np.count_nonzero(drop == 0)} of {len(self.hypotheses)} hypotheses left.")
+
+        self.hypotheses = [hypothesis for hypothesis, dropped in zip(self.hypotheses, drop) if dropped == 0]
+
+    @instrumented('prima_facie', lambda self: {'hypotheses': len(self.hypotheses), 'prima_facie': sum(len(causes) for causes in self.prima_facie.values())})
+    def test_for_prima_facie(self, workers = None, checkpoint = None, resume = False, checkpoint_interval = 600) -> None:
         """
         For a hypothesis of form (c,e), test whether c is a potential cause of e.
+        Windowed prima facie causes are stored as (c, (r, s)).
+
+        Parameters:
+            workers: the number of processes to divide the hypotheses over. By default, all hypotheses are tested in this process.
+            checkpoint: folder to save the tested hypotheses to, every *checkpoint_interval* seconds and at the end (see Checkpoint).
+                        Hypotheses are tested in blocks, which are saved once finished.
+            resume: only test the hypotheses that are not finished in the checkpoint, if it was saved for the same hypotheses.
+            checkpoint_interval: the minimum number of seconds between two checkpoints.
         """
-        for hypothesis in self.generate_iterator(self.hypotheses, "Testing for prima facie conditions"):
-            cause, effect = hypothesis
+        if checkpoint != None:
+            checkpoint = Checkpoint(checkpoint)
+        tested = self.load_prima_facie(checkpoint) if checkpoint != None and resume else {}
+
+        pairs = self.get_hypothesis_pairs()
+        remaining = [hypothesis for hypothesis, pair in zip(self.hypotheses, pairs) if pair not in tested]
 
-            c_and_e, c_trues, e_trues = self.test_cause_effect_pair(cause, effect)
+        saved = time.perf_counter()
+        for block, counts in self.screen_hypotheses(remaining, workers, checkpoint != None):
+            tested.update((pair, self.is_prima_facie(*count)) for pair, count in zip(block, counts))
+            if checkpoint != None and time.perf_counter() - saved >= checkpoint_interval:
+                self.save_prima_facie(checkpoint, tested)
+                saved = time.perf_counter()
 
-            if self.is_prima_facie(c_and_e, c_trues, e_trues):
+        if checkpoint != None:
+            self.save_prima_facie(checkpoint, tested)
+
+        for cause, effect in pairs:
+            if tested[(cause, effect)]:
                 # Add entry to Prima Facie dict containing all causes and their time windows
                 if effect not in self.prima_facie:
                     self.prima_facie[effect] = [cause]
                 else:
                     self.prima_facie[effect].append(cause)
 
-    def test_cause_effect_pair(self, cause, effect) -> Tuple[int, int, int]:
+    def screen_hypotheses(self, hypotheses, workers = None, split = False):
         """
-        Get the amount of traces where the cause occurred, the effect occurred and where the cause occurred before the effect
+        Get the prima facie counts of the hypotheses in blocks, and yield every finished block as its hypothesis pairs (see get_hypothesis_pairs)
+        and their counts (see is_prima_facie). With *split*, the hypotheses are divided into more blocks than needed for the workers,
+        so that finished work can be saved along the way.
         """
+        desc = "Testing for prima facie conditions"
+        if self.windowed:
+            # All windows of a (c,e) pair are tested in one task, see test_cause_effect_windows
+            windows = {}
+            for cause, effect, window in hypotheses:
+                windows.setdefault((cause, effect), []).append(window)
+
+            tasks = [(cause, effect, pair_windows) for (cause, effect), pair_windows in windows.items()]
+            for (cause, effect, pair_windows), counts in zip(tasks, self.run_tasks('test_cause_effect_windows', tasks, desc, workers)):
+                yield [((cause, window), effect) for window in pair_windows], counts
+            return
 
-        subset = copy.deepcopy(self.source[self.source['observation'].isin([cause, effect])])
+        effects = list(dict.fromkeys(effect for _, effect in hypotheses))
+        if len(effects) == 1:
+            # All causes of the effect are screened at once per block, see screen_causes
+            tasks = [(effects[0], block) for block in Inference.get_blocks([cause for cause, _ in hypotheses], workers, split)]
+            for (effect, block), counts in zip(tasks, self.run_tasks('screen_causes', tasks, desc, workers)):
+                yield [(cause, effect) for cause in block], counts
+        else:
+            # All causes against all effects at once, in blocks of causes, see screen_effects
+            tasks = [(effects, block) for block in Inference.get_blocks(list(dict.fromkeys(cause for cause, _ in hypotheses)), workers, split)]
+            for (_, block), (c_and_e, c_trues, e_trues) in zip(tasks, self.run_tasks('screen_effects', tasks, desc, workers)):
+                yield ([(cause, effect) for cause in block for effect in effects],
+                       [(int(c_and_e[i, j]), int(c_trues[i]), int(e_trues[j])) for i in range(len(block)) for j in range(len(effects))])
+
+    @staticmethod
+    def get_blocks(items, workers = None, split = False, blocks = 64) -> list:
+        """
+        Divide *items* into about 4 blocks per worker, and into at least *blocks* blocks with *split*.
+        """
+        n = max(workers * 4 if workers and workers > 1 else 1, blocks if split else 1)
+        size = max(1, -(-len(items) // n))
+        return([items[start:start + size] for start in range(0, len(items), size)])
+
+    def get_hypothesis_pairs(self) -> list:
+        """
+        The hypotheses as (cause, effect) pairs, with windowed causes as (c, (r, s)) like in *prima_facie*.
+        """
+        if self.windowed:
+            return([((cause, window), effect) for cause, effect, window in self.hypotheses])
 
-        c_traces = subset[subset['observation'] == cause]['case:concept:name'].unique()
-        e_traces = subset[subset['observation'] == effect]['case:concept:name'].unique()
-        c_e_cases = set(c_traces).intersection(e_traces)
+        return(list(self.hypotheses))
 
-        c_before_e = 0
+    def get_prima_facie_pairs(self) -> list:
+        return([(cause, effect) for effect in self.prima_facie for cause in self.prima_facie[effect]])
+
+    def save_prima_facie(self, checkpoint, tested) -> None:
+        """
+        Save the hypotheses, which of them are tested, and whether each tested hypothesis is a prima facie cause.
+        """
+        pairs = self.get_hypothesis_pairs()
+        checkpoint.save('prima_facie', windowed = np.array(self.windowed), tested = np.array([pair in tested for pair in pairs], dtype=bool),
+                        prima_facie = np.array([tested.get(pair, False) for pair in pairs], dtype=bool), **Checkpoint.encode_hypotheses(pairs, self.windowed))
+
+    def load_prima_facie(self, checkpoint) -> dict:
+        """
+        The tested hypotheses in the checkpoint, if it was saved for the current hypotheses.
+
+        Returns:
+            Dict mapping every tested hypothesis pair (see get_hypothesis_pairs) to whether it is a prima facie cause.
+        """
+        arrays = checkpoint.load('prima_facie')
+        pairs = self.get_hypothesis_pairs()
+        if arrays == None or bool(arrays['windowed']) != self.windowed or Checkpoint.decode_hypotheses(arrays, self.windowed) != pairs:
+            return({})
+
+        tested = {pair: bool(found) for pair, done, found in zip(pairs, arrays['tested'], arrays['prima_facie']) if done}
+        print(f"Prima facie results of {len(tested)} of {len(pairs)} hypotheses loaded from checkpoint.")
+        return(tested)
+
+    def test_cause_effect_windows(self, cause, effect, windows) -> list:
+        """
+        For every window, get the amount of traces where the cause occurred, the effect occurred and where the cause led to the effect within the window
+        """
+        c_trues = len(self.get_entries(cause)[0])
+        e_trues = len(self.get_entries(effect)[0])
+
+        return([(len(cases), c_trues, e_trues) for cases in self.leads_to(cause, effect, windows)])
+
+    def screen_causes(self, effect, causes, block_size = 1024) -> list:
+        """
+        The counts of test_cause_effect_pair for many causes of one effect at once.
+        The number of cases containing both c and e is the popcount of the intersection of their bitsets for dense causes,
+        and is gathered from the index for sparse causes. Only the causes sharing cases with e are then compared on time.
+        """
+        if self.bitsets is None:
+            self.build_bitsets()
 
-        for case in c_e_cases:
-            trace = subset[subset['case:concept:name'] == case]
-            obs_values = trace['observation'].values
-            time_values = trace['time:timestamp'].values
-            if effect in obs_values:
-                c_times = time_values[obs_values == cause]
-                e_times = time_values[obs_values == effect]
-                if np.min(c_times) <= np.max(e_times):
-                    c_before_e += 1
+        codes = np.array([self.obs_lookup.get(str(cause), -1) for cause in causes], dtype=np.int64)
+        known = np.flatnonzero(codes >= 0)
+        c_trues = np.zeros(len(codes), dtype=np.int64)
+        c_trues[known] = np.diff(self.obs_offsets)[codes[known]]
 
-        return(c_before_e, len(c_traces), len(e_traces))
+        e_cases, _, e_last = self.get_entries(effect)
+        e_trues = len(e_cases)
+        e_last_by_case = np.full(len(self.case_labels), np.nan)
+        e_last_by_case[e_cases] = e_last
+
+        # Cases with both c and e
+        joint = np.zeros(len(codes), dtype=np.int64)
+        rows = self.bitset_rows[codes[known]]
+        dense, sparse = known[rows >= 0], known[rows < 0]
+        if len(dense) > 0:
+            e_bits = np.packbits(~np.isnan(e_last_by_case))
+            for start in range(0, len(dense), block_size):
+                block = dense[start:start + block_size]
+                joint[block] = Inference.popcount(self.bitsets[self.bitset_rows[codes[block]]] & e_bits, axis=1)
+        owners, entries = self.get_entry_indices(codes[sparse])
+        joint[sparse] = np.bincount(owners, weights=~np.isnan(e_last_by_case[self.obs_cases[entries]]), minlength=len(sparse)).astype(np.int64)
+
+        # Of those, the cases where c occurred before the last e
+        c_and_e = np.zeros(len(codes), dtype=np.int64)
+        overlapping = np.flatnonzero(joint > 0)
+        owners, entries = self.get_entry_indices(codes[overlapping])
+        before = self.obs_first[entries] <= e_last_by_case[self.obs_cases[entries]]
+        c_and_e[overlapping] = np.bincount(owners, weights=before, minlength=len(overlapping)).astype(np.int64)
+
+        return([(int(c_and_e[i]), int(c_trues[i]), e_trues) for i in range(len(codes))])
+
+    def screen_effects(self, effects, causes, block_size = 1 << 22) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The counts of test_cause_effect_pair for every (cause, effect) pair at once.
+        The last time of every effect is laid out as one case × effect matrix, against which all index entries of the causes
+        are compared in one vectorized step (in blocks of at most *block_size* comparisons).
+
+        Returns:
+            c_and_e (causes × effects), c_trues (per cause) and e_trues (per effect).
+        """
+        c_codes = np.array([self.obs_lookup.get(str(cause), -1) for cause in causes], dtype=np.int64)
+        known = np.flatnonzero(c_codes >= 0)
+        c_trues = np.zeros(len(causes), dtype=np.int64)
+        c_trues[known] = np.diff(self.obs_offsets)[c_codes[known]]
+
+        e_last = np.full((len(self.case_labels), len(effects)), np.nan)
+        e_trues = np.zeros(len(effects), dtype=np.int64)
+        for j, effect in enumerate(effects):
+            e_cases, _, last = self.get_entries(effect)
+            e_last[e_cases, j] = last
+            e_trues[j] = len(e_cases)
+
+        c_and_e = np.zeros((len(causes), len(effects)), dtype=np.int64)
+        owners, entries = self.get_entry_indices(c_codes[known])
+        step = max(1, block_size // max(1, len(effects)))
+        for start in range(0, len(entries), step):
+            block = entries[start:start + step]
+            before = (self.obs_first[block, np.newaxis] <= e_last[self.obs_cases[block]]).astype(np.int64)
+            # The entries of a cause are contiguous, so they are summed per cause segment
+            block_owners, segments = np.unique(owners[start:start + step], return_index=True)
+            c_and_e[known[block_owners]] += np.add.reduceat(before, segments, axis=0)
+
+        return(c_and_e, c_trues, e_trues)
+
+    def test_cause_effect_pair(self, cause, effect) -> Tuple[int, int, int]:
+        """
+        Get the amount of traces where the cause occurred, the effect occurred and where the cause occurred before the effect
+        """
+
+        c_cases, c_first, _ = self.get_entries(cause)
+        e_cases, _, e_last = self.get_entries(effect)
+        c_before_e = Kernels.count_before(c_cases, c_first, e_cases, e_last)
+
+        return(c_before_e, len(c_cases), len(e_cases))
 
     def is_prima_facie(self, c_and_e, c_trues, e_trues) -> bool:
         """
@@ -116,21 +531,147 @@ class Inference:
         
         return (c_and_e / c_trues > e_trues / self.traces)
 
-    def calculate_average_epsilons(self, target_file) -> None:
+    @instrumented('epsilon', lambda self: {'prima_facie': sum(len(causes) for causes in self.prima_facie.values()), 'epsilons': len(self.epsilons), 'pruned': dict(self.pruned)})
+    def calculate_average_epsilons(self, target_file, batch = False, workers = None, significance = False, top_k = None, checkpoint = None, resume = False, checkpoint_interval = 600) -> None:
         """
         Get the epsilon values for all relationships
 
         Parameters:
             target_file: the output file to write results to.
+            batch: compute the epsilon values of all causes of an effect at once (see get_epsilon_averages). Always used for windowed hypotheses.
+            workers: the number of processes to divide the effects (batch) or (effect, cause) pairs over.
+            significance: also write the z-score, p-value and q-value of every epsilon value (see calculate_significance).
+            top_k: only keep the *top_k* causes with the highest epsilon values of every effect (see get_top_epsilon_averages).
+            checkpoint: folder to save the finished epsilon values to, every *checkpoint_interval* seconds and at the end (see Checkpoint).
+                        Work is finished per (effect, cause) pair, or per effect with *batch*, windowed hypotheses or *top_k*.
+            resume: skip the work finished in the checkpoint, if it was saved for the same prima facie causes and options.
+            checkpoint_interval: the minimum number of seconds between two checkpoints.
         """
-        with open(target_file, mode='w') as f:
-            f.write(f"cause,effect,epsilon")
+        self.epsilons = []
+
+        # Results are collected per unit of work: an effect, or an (effect, cause) pair
+        mode = f"top {top_k}" if top_k != None else "effects" if batch or self.windowed else "pairs"
+        if checkpoint != None:
+            checkpoint = Checkpoint(checkpoint)
+        finished, skipped = self.load_epsilons(checkpoint, mode) if checkpoint != None and resume else ({}, 0)
+
+        if mode == "pairs":
+            units = [(effect, cause) for effect in self.prima_facie for cause in self.prima_facie[effect]]
+            pairs = [pair for pair in units if pair not in finished]
+            results = self.run_tasks('get_epsilon_average', pairs, "Calculating Epsilon values", workers)
+            results = (((effect, cause), [(cause, effect, epsilon_avg)], 0) for (effect, cause), epsilon_avg in zip(pairs, results))
+        else:
+            units = list(self.prima_facie)
+            effects = [effect for effect in units if effect not in finished]
+            if top_k != None and not (batch or self.windowed):
+                results = self.run_tasks('get_top_epsilon_averages', [(effect, top_k) for effect in effects], "Calculating Epsilon values", workers)
+            elif top_k != None:
+                results = ((Inference.select_top(epsilons, top_k), 0) for epsilons in self.get_batch_epsilon_averages(workers, effects))
+            else:
+                results = (({cause: epsilons[cause] for cause in self.prima_facie[effect]}, 0) for effect, epsilons in zip(effects, self.get_batch_epsilon_averages(workers, effects)))
+            results = ((effect, [(cause, effect, epsilons[cause]) for cause in epsilons], effect_skipped) for effect, (epsilons, effect_skipped) in zip(effects, results))
+
+        saved = time.perf_counter()
+        for unit, rows, unit_skipped in results:
+            finished[unit] = rows
+            skipped += unit_skipped
+            if checkpoint != None and time.perf_counter() - saved >= checkpoint_interval:
+                self.save_epsilons(checkpoint, mode, finished, skipped)
+                saved = time.perf_counter()
 
-            for effect in self.prima_facie:
-                for cause in self.generate_iterator(self.prima_facie[effect], desc = "Calculating Epsilon values"):
-                    epsilon_avg = self.get_epsilon_average(effect, cause)
+        if checkpoint != None:
+            self.save_epsilons(checkpoint, mode, finished, skipped)
+
+        self.epsilons = [row for unit in units for row in finished[unit]]
+        if top_k != None:
+            self.pruned['top_k_terms'] = skipped
+            print(f"Top {top_k} causes per effect kept, {self.pruned['top_k_terms']} epsilon_x terms skipped.")
+
+        header = "cause,effect,r,s" if self.windowed else "cause,effect"
+        # Compute the q-values before opening the target file, so that a failure does not leave it truncated
+        results = self.calculate_significance() if significance else None
+        with open(target_file, mode='w') as f:
+            if not significance:
+                f.write(f"{header},epsilon")
+                for cause, effect, epsilon in self.epsilons:
                     f.write("\n")
-                    f.write(f"{cause},{effect},{epsilon_avg}")
+                    f.write(f"{self.format_hypothesis(cause, effect)},{epsilon}")
+                return
+
+            f.write(f"{header},epsilon,z,p,q")
+            for (cause, effect, epsilon), z, p, q in zip(self.epsilons, results['z'], results['p'], results['q']):
+                f.write("\n")
+                f.write(f"{self.format_hypothesis(cause, effect)},{epsilon},{z},{p},{q}")
+
+    def save_epsilons(self, checkpoint, mode, finished, skipped) -> None:
+        """
+        Save the finished units of work of calculate_average_epsilons, with the prima facie causes they were computed for.
+        """
+        rows = [row for unit in finished for row in finished[unit]]
+        epsilons = [epsilon for _, _, epsilon in rows]
+        prima_facie = {f"prima_facie_{key}": array for key, array in Checkpoint.encode_hypotheses(self.get_prima_facie_pairs(), self.windowed).items()}
+
+        checkpoint.save('epsilons', mode = np.array(mode), windowed = np.array(self.windowed), skipped = np.array(skipped),
+                        done = np.array(list(finished) if mode != "pairs" else [], dtype=str),
+                        epsilon = np.array([np.nan if epsilon == None else epsilon for epsilon in epsilons], dtype=float),
+                        missing = np.array([epsilon == None for epsilon in epsilons], dtype=bool),
+                        **Checkpoint.encode_hypotheses([(cause, effect) for cause, effect, _ in rows], self.windowed), **prima_facie)
+
+    def load_epsilons(self, checkpoint, mode) -> Tuple[dict, int]:
+        """
+        The finished units of work saved by save_epsilons, if saved in the same mode for the current prima facie causes.
+
+        Returns:
+            Dict mapping every finished unit to its (cause, effect, epsilon) rows, and the number of epsilon_x terms skipped.
+        """
+        arrays = checkpoint.load('epsilons')
+        if arrays == None:
+            return({}, 0)
+
+        pairs = self.get_prima_facie_pairs()
+        prima_facie = {key[len("prima_facie_"):]: array for key, array in arrays.items() if key.startswith("prima_facie_")}
+        if str(arrays['mode']) != mode or bool(arrays['windowed']) != self.windowed or Checkpoint.decode_hypotheses(prima_facie, self.windowed) != pairs:
+            print("Epsilon checkpoint ignored: it was saved for other prima facie causes or options.")
+            return({}, 0)
+
+        # Use the causes and effects of this instance, which may differ in type from the decoded ones (e.g. int windows)
+        current = {pair: pair for pair in pairs}
+        finished = {effect: [] for effect in arrays['done'].tolist()}
+        for pair, epsilon, missing in zip(Checkpoint.decode_hypotheses(arrays, self.windowed), arrays['epsilon'].tolist(), arrays['missing']):
+            cause, effect = current[pair]
+            finished.setdefault((effect, cause) if mode == "pairs" else effect, []).append((cause, effect, None if missing else epsilon))
+
+        print(f"Epsilon values of {len(finished)} finished units of work loaded from checkpoint.")
+        return(finished, int(arrays['skipped']))
+
+    def format_hypothesis(self, cause, effect) -> str:
+        """
+        The cause, effect and (for windowed hypotheses) window columns of an output row.
+        """
+        if self.windowed:
+            cause, (r, s) = cause
+            return(f"{cause},{effect},{r},{s}")
+
+        return(f"{cause},{effect}")
+
+    @instrumented('significance', lambda self: {'epsilons': len(self.epsilons)})
+    def calculate_significance(self, by_effect = False) -> pd.DataFrame:
+        """
+        False discovery rates of the epsilon values computed by calculate_average_epsilons(), see Significance.compute_q.
+        Replaces running R/causal_significance.R on the output file.
+
+        Parameters:
+            by_effect: estimate the false discovery rates per effect instead of over all epsilon values at once.
+        """
+        epsilons = pd.DataFrame(self.epsilons, columns=['cause', 'effect', 'epsilon'])
+        epsilons['epsilon'] = pd.to_numeric(epsilons['epsilon'])
+
+        if self.windowed:
+            epsilons.insert(2, 'r', [r for _, (r, _) in epsilons['cause']])
+            epsilons.insert(3, 's', [s for _, (_, s) in epsilons['cause']])
+            epsilons['cause'] = [cause for cause, _ in epsilons['cause']]
+
+        return(compute_q(epsilons, by = 'effect' if by_effect else None))
 
     def get_epsilon_average(self, effect, cause) -> float:
         """
@@ -152,45 +693,254 @@ class Inference:
         
         return None
 
-    def calculate_probability_differences(self, effect, cause, x) -> float:
+    def get_top_epsilon_averages(self, effect, k) -> Tuple[dict, int]:
         """
-        Calculates the epsilon_x value for a specific effect, cause, and x.
+        Calculates the epsilon values of the *k* prima facie causes of an effect with the highest epsilon values.
+        Every epsilon_x term lies in [-1, 1], so after m of the n terms of a cause its average is at most (sum + n - m) / n.
+        A cause is no longer evaluated once that bound falls below the k-th highest epsilon value found so far.
+        The values of the kept causes are identical to get_epsilon_average.
+
+        Returns:
+            Dict mapping the top k causes to their epsilon values, in the order of the prima facie causes, and the number of epsilon_x terms skipped.
+        """
+        causes = self.prima_facie[effect]
+        if len(causes) < 2:
+            return({cause: None for cause in causes[:k]}, 0)
+
+        n = len(causes) - 1
+        epsilons = {}
+        top = []
+        skipped = 0
+
+        for cause in causes:
+            eps_x = 0
+            for m, x in enumerate([x for x in causes if x != cause]):
+                # Small margin for rounding in the sums
+                if len(top) == k and (eps_x + n - m) / n + 1e-9 < top[0]:
+                    skipped += n - m
+                    break
+                eps_x += self.calculate_probability_differences(effect, cause, x)
+            else:
+                epsilons[cause] = eps_x / n
+                if len(top) < k:
+                    heappush(top, epsilons[cause])
+                elif epsilons[cause] > top[0]:
+                    heapreplace(top, epsilons[cause])
+
+        return(Inference.select_top(epsilons, k), skipped)
+
+    @staticmethod
+    def select_top(epsilons, k) -> dict:
+        """
+        Keep the *k* entries with the highest epsilon values, in their original order. Ties are broken by that order.
+        """
+        ranked = sorted(epsilons, key = lambda cause: -epsilons[cause] if epsilons[cause] != None else 0)
+        keep = set(ranked[:k])
+
+        return({cause: epsilons[cause] for cause in epsilons if cause in keep})
+
+    def get_batch_epsilon_averages(self, workers = None, effects = None):
+        """
+        Yields the epsilon values of every effect in *effects* (by default, all effects in *prima_facie*), in order (see get_epsilon_averages).
+        The effects are divided over the workers in groups that share one pass over the cases, see get_shared_epsilon_averages.
+        Windowed hypotheses are computed per effect.
+        """
+        effects = list(self.prima_facie) if effects == None else effects
+        if self.windowed:
+            for epsilons in self.run_tasks('get_epsilon_averages', [(effect,) for effect in effects], "Calculating Epsilon values", workers):
+                yield epsilons
+            return
+
+        groups = workers if workers and workers > 1 else 1
+        size = max(1, -(-len(effects) // groups))
+        tasks = [(effects[start:start + size],) for start in range(0, len(effects), size)]
+        for group in self.run_tasks('get_shared_epsilon_averages', tasks, "Calculating Epsilon values", workers):
+            for epsilons in group:
+                yield epsilons
+
+    def get_shared_epsilon_averages(self, effects, block_size = 65536) -> list:
+        """
+        Calculates the epsilon values of all prima facie causes of several effects, as get_epsilon_averages does for one effect.
+        The case × cause first time matrix is built once per block of cases for the causes of all effects together,
+        and the case × effect last time matrix once for all effects; every effect then takes its columns from them.
+
+        Returns:
+            List with the dict of get_epsilon_averages for every effect.
+        """
+        causes = list(dict.fromkeys(cause for effect in effects for cause in self.prima_facie[effect]))
+        columns = {cause: i for i, cause in enumerate(causes)}
+        batched = [j for j, effect in enumerate(effects) if len(self.prima_facie[effect]) >= 2]
+        indices = {j: np.array([columns[cause] for cause in self.prima_facie[effects[j]]]) for j in batched}
+        counts = {j: Inference.new_counts(len(indices[j])) for j in batched}
+
+        for start in range(0, len(self.case_labels) if len(batched) > 0 else 0, block_size):
+            end = min(start + block_size, len(self.case_labels))
+            first = self.get_first_times(causes, start, end)
+            e_last = self.get_first_times(effects, start, end, last = True)
+            occurred = np.isfinite(first)
+
+            for j in batched:
+                Inference.add_counts(counts[j], occurred[:, indices[j]], first[:, indices[j]] <= e_last[:, [j]])
+
+        results = []
+        for j, effect in enumerate(effects):
+            causes = self.prima_facie[effect]
+            if j not in counts:
+                results.append({cause: None for cause in causes})
+                continue
+
+            eps_x = Inference.sum_epsilons(*counts[j])
+            results.append({cause: eps_x[i] / (len(causes) - 1) for i, cause in enumerate(causes)})
+
+        return(results)
+
+    def get_epsilon_averages(self, effect, block_size = 65536) -> dict:
+        """
+        Calculates the epsilon values of all prima facie causes of an effect in one pass.
+        All P(e|c ∧ x) − P(e|¬c ∧ x) terms are derived from boolean case × cause matrices:
+            H[case, c]: c occurred in the case
+            O[case, c]: c occurred no later than the last occurrence of e in the case
+        so that, for every pair (c, x) at once,
+            c_and_x = H'H,  c_and_x_and_e = O'O,
+            not_c_and_x = sum(H[:, x]) - c_and_x,  not_c_and_x_and_e = sum(O[:, x]) - H'O.
+        The results are identical to calling get_epsilon_average for every cause.
+        For windowed causes (c, (r, s)), O[case, c] is replaced by: c led to e within (r, s) in the case (see leads_to).
+        Causes without windows are counted by get_shared_epsilon_averages, for this effect alone.
+
+        Parameters:
+            effect: the variable representing the effect.
+            block_size: the number of cases held in memory at once.
+
+        Returns:
+            Dict mapping every prima facie cause to its epsilon value (None when it is the only cause).
+        """
+        causes = self.prima_facie[effect]
+        k = len(causes)
+        if k < 2:
+            return({cause: None for cause in causes})
+
+        if not self.windowed:
+            return(self.get_shared_epsilon_averages([effect], block_size)[0])
+
+        counts = Inference.new_counts(k)
+        labels = [cause for cause, _ in causes]
+        led_to = self.get_leads_to(causes, effect)
+
+        for start in range(0, len(self.case_labels), block_size):
+            end = min(start + block_size, len(self.case_labels))
+            Inference.add_counts(counts, np.isfinite(self.get_first_times(labels, start, end)), self.get_case_matrix(led_to, start, end))
+
+        eps_x = Inference.sum_epsilons(*counts)
+
+        return({cause: eps_x[i] / (k - 1) for i, cause in enumerate(causes)})
+
+    @staticmethod
+    def new_counts(k) -> list:
         """
+        Zero counts [cx, cxe, c_xe, x_trues, xe_trues] of sum_epsilons for *k* causes.
+        """
+        return([np.zeros((k, k)) for _ in range(3)] + [np.zeros(k) for _ in range(2)])
 
-        c_and_x = 0
-        c_and_x_and_e = 0
-        not_c_and_x = 0
-        not_c_and_x_and_e = 0
+    @staticmethod
+    def add_counts(counts, h, o) -> None:
+        """
+        Add the counts of a block of cases to the counts of sum_epsilons, from its boolean case × cause matrices H and O (see get_epsilon_averages).
+        """
+        h, o = h.astype(np.float32), o.astype(np.float32)
+        cx, cxe, c_xe, x_trues, xe_trues = counts
 
-        # Because every counter requires x in the trace, only iterate over cases in which x is present.
-        subset = copy.deepcopy(self.source[self.source['observation'].isin([cause, effect, x])])
-        x_cases = subset[subset['observation'] == x]['case:concept:name'].unique()
+        # Counts within a block are exact in float32 (< 2^24)
+        cx += h.T @ h
+        cxe += o.T @ o
+        c_xe += h.T @ o
+        x_trues += h.sum(axis = 0)
+        xe_trues += o.sum(axis = 0)
 
-        for case in x_cases:
-            trace = subset[subset['case:concept:name'] == case]
-            obs_values = trace['observation'].values
-            time_values = trace['time:timestamp'].values
+    @staticmethod
+    def sum_epsilons(cx, cxe, c_xe, x_trues, xe_trues) -> np.ndarray:
+        """
+        Sums P(e|c ∧ x) − P(e|¬c ∧ x) over all other causes x, for every cause c, from the counts of get_epsilon_averages.
 
-            # counts for c and x
-            if np.any(obs_values == cause) and np.any(obs_values == x):
-                c_and_x += 1
-                if np.any(obs_values == effect):
-                    c_times = time_values[obs_values == cause]
-                    x_times = time_values[obs_values == x]
-                    e_times = time_values[obs_values == effect]
+        Parameters:
+            cx:         k × k matrix, number of cases with c and x
+            cxe:        k × k matrix, number of cases where c and x occurred before the (last) effect
+            c_xe:       k × k matrix, number of cases with c where x occurred before the (last) effect
+            x_trues:    number of cases with x
+            xe_trues:   number of cases where x occurred before the (last) effect
+        """
+        k = len(x_trues)
+        not_cx = x_trues[np.newaxis, :] - cx
+        not_cxe = xe_trues[np.newaxis, :] - c_xe
 
-                    if np.min(c_times) <= np.max(e_times) and np.min(x_times) <= np.max(e_times):
-                        c_and_x_and_e += 1
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            eps = np.where((cx == 0) | (not_cx == 0), 0, cxe / cx - not_cxe / not_cx)
 
-            # counts for not c only x
-            if np.all(obs_values != cause) and np.any(obs_values == x):
-                not_c_and_x += 1
-                if np.any(obs_values == effect):
-                    x_times = time_values[obs_values == x]
-                    e_times = time_values[obs_values == effect]
+        # Sum the x terms in the same order as get_epsilon_average
+        eps_x = np.zeros(k)
+        for j in range(k):
+            eps_x += np.where(np.arange(k) != j, eps[:, j], 0)
 
-                    if np.min(x_times) <= np.max(e_times):
-                        not_c_and_x_and_e += 1
+        return(eps_x)
+
+    def get_first_times(self, observations, start, end, last = False) -> np.ndarray:
+        """
+        Builds the case × observation matrix of earliest occurrence times for the cases with codes in [start, end).
+        Cases in which an observation was not made get +inf, or NaN when *last* is set.
+
+        Parameters:
+            observations: the observations forming the columns of the matrix.
+            start, end: the range of case codes forming the rows of the matrix.
+            last: use the latest instead of the earliest occurrence time.
+        """
+        matrix = np.full((end - start, len(observations)), np.nan if last else np.inf)
+
+        for j, obs in enumerate(observations):
+            cases, first, last_times = self.get_entries(obs)
+            lo, hi = np.searchsorted(cases, [start, end])
+            matrix[cases[lo:hi] - start, j] = (last_times if last else first)[lo:hi]
+
+        return(matrix)
+
+    def get_leads_to(self, causes, effect) -> list:
+        """
+        The cases in which every windowed cause (c, (r, s)) led to the effect. The windows of the same c share one pass, see leads_to.
+        """
+        windows = {}
+        for cause, window in causes:
+            windows.setdefault(cause, []).append(window)
+
+        cases = {}
+        for cause in windows:
+            for window, led_to in zip(windows[cause], self.leads_to(cause, effect, windows[cause])):
+                cases[(cause, window)] = led_to
+
+        return([cases[cause] for cause in causes])
+
+    def get_case_matrix(self, case_sets, start, end) -> np.ndarray:
+        """
+        Builds the boolean case × set matrix for the cases with codes in [start, end), from sorted arrays of case codes.
+        """
+        matrix = np.zeros((end - start, len(case_sets)), dtype=bool)
+
+        for j, cases in enumerate(case_sets):
+            lo, hi = np.searchsorted(cases, [start, end])
+            matrix[cases[lo:hi] - start, j] = True
+
+        return(matrix)
+
+    def calculate_probability_differences(self, effect, cause, x) -> float:
+        """
+        Calculates the epsilon_x value for a specific effect, cause, and x.
+        """
+
+        # Because every counter requires x in the trace, only look at the cases in which x is present.
+        x_cases, x_first, _ = self.get_entries(x)
+        c_cases, c_first, _ = self.get_entries(cause)
+        e_cases, _, e_last = self.get_entries(effect)
+
+        # counts for c and x, and for not c only x (see Kernels.count_epsilon_x)
+        c_and_x, c_and_x_and_e, not_c_and_x_and_e = Kernels.count_epsilon_x(x_cases, x_first, c_cases, c_first, e_cases, e_last)
+        not_c_and_x = len(x_cases) - c_and_x
 
         # Return value: P(e|c ∧ x) − P(e|¬c ∧ x)
         # or e and c and x / c and x - e not c and x / not c and x
@@ -199,6 +949,58 @@ class Inference:
         else:
             return(c_and_x_and_e / c_and_x - not_c_and_x_and_e / not_c_and_x)
 
+    ###########
+    # Workers #
+    ###########
+
+    def run_tasks(self, method, tasks, desc = None, workers = None):
+        """
+        Calls *method* for every tuple of arguments in *tasks* and yields the results in the order of *tasks*.
+
+        Parameters:
+            method: the name of the method to call.
+            tasks: a list of argument tuples.
+            desc: the description of the progress bar.
+            workers: the number of processes to divide the tasks over. By default, all calls are made in this process.
+        """
+        if not workers or workers < 2:
+            for args in self.generate_iterator(tasks, desc):
+                yield getattr(self, method)(*args)
+            return
+
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with self.worker_pool(workers) as pool:
+            results = pool.imap(_run_task, [(method, args) for args in tasks], chunksize)
+            for result in self.generate_iterator(results, desc):
+                yield result
+
+    @contextmanager
+    def worker_pool(self, workers):
+        """
+        Starts a pool of processes that each hold a copy of this instance without the source data.
+        The observation index is written to disk once and memory-mapped by the workers instead of being pickled for every task.
+        """
+        with tempfile.TemporaryDirectory(prefix="aitia-") as folder:
+            if self.bitsets is None:
+                self.build_bitsets()
+
+            names = ['obs_offsets', 'obs_cases', 'obs_first', 'obs_last', 'bitsets', 'bitset_rows']
+            if self.windowed:
+                if self.event_offsets is None:
+                    self.build_event_index()
+                names += ['event_offsets', 'event_sorted_cases', 'event_sorted_times']
+
+            arrays = {}
+            for name in names:
+                arrays[name] = os.path.join(folder, f"{name}.npy")
+                np.save(arrays[name], getattr(self, name))
+
+            attributes = {'pb': False, 'traces': self.traces, 'case_labels': self.case_labels,
+                          'obs_lookup': self.obs_lookup, 'prima_facie': self.prima_facie, 'windowed': self.windowed, 'effect_keys': {}}
+
+            with Pool(workers, initializer=_init_worker, initargs=(arrays, attributes)) as pool:
+                yield pool
+
     #########
     # Other #
     #########
@@ -212,6 +1014,23 @@ class Inference:
         else:
             return tqdm.tqdm(iter,  desc = desc)
 
+    @staticmethod
+    def get_candidates(c_trues, x_trues, range) -> list:
+        """
+        For every timepoint t of *c_trues*, the timepoints of *x_trues* within [t - range, t + range], in the order of *x_trues*.
+        The timepoints of *x_trues* are sorted once and the bounds of every range are found by binary search.
+        """
+        keys = list(x_trues)
+        times = np.array(keys, dtype=np.float64)
+        order = np.argsort(times, kind='stable')
+        sorted_times = times[order]
+
+        c_times = np.array(list(c_trues), dtype=np.float64)
+        lo = np.searchsorted(sorted_times, c_times - range, side='left')
+        hi = np.searchsorted(sorted_times, c_times + range, side='right')
+
+        return([[keys[i] for i in np.sort(order[l:h])] for l, h in zip(lo, hi)])
+
     @staticmethod
     def get_ands(c_trues, x_trues, window) -> list:
         """
@@ -230,12 +1049,12 @@ class Inference:
         r, s = window
         range = s - r
 
-        for t in c_trues:
+        x_sets = {key: set(x_trues[key]) for key in x_trues}
+        for t, x_candidates in zip(c_trues, Inference.get_candidates(c_trues, x_trues, range)):
             c_cases = c_trues[t]
             window1 = (t + r, t + s)
-            x_candidates = [key for key in x_trues if key >= t - range and key <= t + range]
             for cand in x_candidates:
-                x_cases = x_trues[cand]
+                x_cases = x_sets[cand]
                 intersection = [c for c in c_cases if c in x_cases]
                 window2 = (cand + r, cand + s)
                 overlap = Inference.get_overlap(window1, window2)
@@ -259,12 +1078,12 @@ class Inference:
         r, s = window
         range = s - r
 
-        for t in c_trues:
+        x_sets = {key: set(x_trues[key]) for key in x_trues}
+        for t, x_candidates in zip(c_trues, Inference.get_candidates(c_trues, x_trues, range)):
             c_cases = c_trues[t]
             window1 = (t + r, t + s)
-            x_candidates = [key for key in x_trues if key >= t - range and key <= t + range]
             for cand in x_candidates:
-                x_cases = x_trues[cand]
+                x_cases = x_sets[cand]
                 intersection = [c for c in c_cases if c in x_cases]
                 window2 = (cand + r, cand + s)
 
@@ -289,13 +1108,22 @@ class Inference:
         Returns:
             The number of times (Int) e was true in the provided time windows.
         """
+        # Sorted timepoints of e per case, so every (window, case) pair is a single binary search
+        e_by_case = {}
+        for e in e_trues:
+            for e_case in e_trues[e]:
+                e_by_case.setdefault(e_case, []).append(e)
+        e_by_case = {e_case: np.sort(np.array(times, dtype=np.float64)) for e_case, times in e_by_case.items()}
+
         res = 0
 
         for (ws, we), intersection in windows:
-            for e in e_trues:
-                e_cases = e_trues[e]
-                inter = [e_case for e_case in e_cases if e_case in intersection]
-                if e >= ws and e <= we and len(inter) != 0:
+            for case in intersection:
+                times = e_by_case.get(case)
+                if times is None:
+                    continue
+                pos = np.searchsorted(times, ws, side='left')
+                if pos < len(times) and times[pos] <= we:
                     res += 1
                     break
         
@@ -337,3 +1165,53 @@ class Inference:
         # when both windows are the same, return None
         else:
             return(None)
+
+
+class ObservationTimes(Mapping):
+    """
+    Read-only view of the form {observation: {case: [timestamps]}} over the encoded events of an Inference instance.
+    The events are sorted by observation once; the dictionary of an observation is only built when it is first requested.
+    """
+
+    def __init__(self, obs_labels, case_labels, event_obs, event_cases, event_times) -> None:
+        self.labels = obs_labels
+        self.codes = {obs: code for code, obs in enumerate(obs_labels)}
+        self.case_labels = np.asarray(case_labels)
+        self.event_cases = event_cases
+        self.event_times = event_times
+
+        # Events of observation code o are found at order[offsets[o]:offsets[o + 1]], in their original order
+        self.order = np.argsort(event_obs, kind='stable')
+        self.offsets = np.searchsorted(event_obs[self.order], np.arange(len(obs_labels) + 1))
+        self.built = {}
+
+    def __getitem__(self, obs) -> dict:
+        code = self.codes[obs]
+        if code not in self.built:
+            rows = self.order[self.offsets[code]:self.offsets[code + 1]]
+            times = pd.Series(self.event_times[rows], index=self.case_labels[self.event_cases[rows]])
+            self.built[code] = times.groupby(level=0, sort=False).agg(list).to_dict()
+
+        return self.built[code]
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+
+def _init_worker(arrays, attributes) -> None:
+    """
+    Initialises a worker process of Inference.worker_pool() by memory-mapping the observation index.
+    """
+    global _worker
+    _worker = Inference.__new__(Inference)
+    _worker.__dict__.update(attributes)
+
+    for name, path in arrays.items():
+        setattr(_worker, name, np.load(path, mmap_mode='r'))
+
+def _run_task(task):
+    method, args = task
+    return getattr(_worker, method)(*args)
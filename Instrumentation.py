@@ -0,0 +1,89 @@
+import sys
+import json
+import time
+import datetime
+import functools
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: peak memory is then not reported
+    resource = None
+
+class Instrumentation:
+    """
+    Event sink reporting the stages of Hypothesizer and Inference as JSON lines.
+
+    Every event holds the component, the stage, its wall time in seconds, the peak resident memory of the process so far,
+    and stage specific counts such as rows in and out, cases, hypotheses and pruned hypotheses.
+    Only a clock and the resource usage are read per stage, so it can be left on in production.
+    """
+
+    def __init__(self, target = None) -> None:
+        """
+        Parameters:
+            target: a path to append the JSON lines to, an object with a write() method, or a function called with every event (as a dict).
+                    By default, the events are written to standard error.
+        """
+        self.target = sys.stderr if target == None else target
+
+    def emit(self, event: dict) -> None:
+        if callable(self.target):
+            self.target(event)
+            return
+
+        line = json.dumps(event, default=str) + "\n"
+        if isinstance(self.target, str):
+            with open(self.target, mode='a') as f:
+                f.write(line)
+        else:
+            self.target.write(line)
+
+    @contextmanager
+    def stage(self, component: str, stage: str, **fields):
+        """
+        Time the enclosed block and emit it as one event. The block can add counts to the yielded event.
+        """
+        event = {'time': datetime.datetime.now().isoformat(), 'component': component, 'stage': stage, **fields}
+        start = time.perf_counter()
+        yield event
+
+        event['seconds'] = round(time.perf_counter() - start, 6)
+        event['peak_rss_mb'] = Instrumentation.peak_rss()
+        self.emit(event)
+
+    @staticmethod
+    def peak_rss() -> float:
+        """
+        Peak resident memory of the process in MB, or None when it is not available.
+        """
+        if resource == None:
+            return None
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        return round(peak / 2**20 if sys.platform == 'darwin' else peak / 2**10, 3)
+
+def instrumented(stage: str, fields = None):
+    """
+    Decorator reporting every call of a method as a stage to the *instrumentation* of its instance, if set.
+    *fields* is called with the instance after the method returns, and gives the counts to add to the event.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = getattr(self, 'instrumentation', None)
+            if instrumentation == None:
+                return method(self, *args, **kwargs)
+
+            with instrumentation.stage(type(self).__name__, stage) as event:
+                result = method(self, *args, **kwargs)
+                if fields != None:
+                    event.update(fields(self))
+
+            return result
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,109 @@
+"""
+Counting kernels of Inference over the per observation index (see Inference.build_index): for every observation, the sorted codes of
+the cases it was made in, with its first and last occurrence time in each case.
+
+When Numba is installed, the counts are computed by compiled merge joins over these arrays, without allocating masks per call.
+Otherwise, the NumPy versions are used. Both give the same counts.
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    # Numba is optional: without it, the NumPy versions of the kernels are used
+    numba = None
+
+# Use the compiled kernels, if Numba is installed
+JIT = numba != None
+
+def count_before(c_cases, c_first, e_cases, e_last) -> int:
+    """
+    The number of cases in which c occurred no later than the last occurrence of e.
+    """
+    if JIT:
+        return int(count_before_jit(c_cases, c_first, e_cases, e_last))
+
+    return count_before_numpy(c_cases, c_first, e_cases, e_last)
+
+def count_epsilon_x(x_cases, x_first, c_cases, c_first, e_cases, e_last):
+    """
+    The counts of the epsilon_x term of a cause c, another cause x and an effect e, over the cases containing x:
+        c_and_x:            cases containing c
+        c_and_x_and_e:      cases where c and x occurred no later than the last e
+        not_c_and_x_and_e:  cases without c where x occurred no later than the last e
+    """
+    if JIT:
+        c_and_x, c_and_x_and_e, not_c_and_x_and_e = count_epsilon_x_jit(x_cases, x_first, c_cases, c_first, e_cases, e_last)
+        return int(c_and_x), int(c_and_x_and_e), int(not_c_and_x_and_e)
+
+    return count_epsilon_x_numpy(x_cases, x_first, c_cases, c_first, e_cases, e_last)
+
+def align(query, cases, values):
+    """
+    For every case in *query*, look up whether it occurs in the sorted array *cases* and get its entry in *values* (NaN when absent).
+    """
+    if len(cases) == 0:
+        return np.zeros(len(query), dtype=bool), np.full(len(query), np.nan)
+
+    pos = np.searchsorted(cases, query).clip(max=len(cases) - 1)
+    found = cases[pos] == query
+    return found, np.where(found, values[pos], np.nan)
+
+def count_before_numpy(c_cases, c_first, e_cases, e_last) -> int:
+    # Only cases containing both c and e can have c before e
+    _, c_idx, e_idx = np.intersect1d(c_cases, e_cases, assume_unique=True, return_indices=True)
+    return int(np.count_nonzero(c_first[c_idx] <= e_last[e_idx]))
+
+def count_epsilon_x_numpy(x_cases, x_first, c_cases, c_first, e_cases, e_last):
+    has_c, c_first = align(x_cases, c_cases, c_first)
+    has_e, e_last = align(x_cases, e_cases, e_last)
+    x_before_e = has_e & (x_first <= e_last)
+
+    c_and_x = int(np.count_nonzero(has_c))
+    c_and_x_and_e = int(np.count_nonzero(has_c & x_before_e & (c_first <= e_last)))
+    not_c_and_x_and_e = int(np.count_nonzero(~has_c & x_before_e))
+
+    return c_and_x, c_and_x_and_e, not_c_and_x_and_e
+
+if numba != None:
+    @numba.njit(cache=True, nogil=True)
+    def count_before_jit(c_cases, c_first, e_cases, e_last):
+        # Merge join of the sorted case codes of c and e
+        count = 0
+        j = 0
+        for i in range(len(c_cases)):
+            while j < len(e_cases) and e_cases[j] < c_cases[i]:
+                j += 1
+            if j == len(e_cases):
+                break
+            if e_cases[j] == c_cases[i] and c_first[i] <= e_last[j]:
+                count += 1
+
+        return count
+
+    @numba.njit(cache=True, nogil=True)
+    def count_epsilon_x_jit(x_cases, x_first, c_cases, c_first, e_cases, e_last):
+        # Walk the cases of x, advancing through the sorted case codes of c and e
+        c_and_x = 0
+        c_and_x_and_e = 0
+        not_c_and_x_and_e = 0
+        jc = 0
+        je = 0
+        for i in range(len(x_cases)):
+            case = x_cases[i]
+            while jc < len(c_cases) and c_cases[jc] < case:
+                jc += 1
+            while je < len(e_cases) and e_cases[je] < case:
+                je += 1
+
+            has_c = jc < len(c_cases) and c_cases[jc] == case
+            if has_c:
+                c_and_x += 1
+            if je < len(e_cases) and e_cases[je] == case and x_first[i] <= e_last[je]:
+                if not has_c:
+                    not_c_and_x_and_e += 1
+                elif c_first[jc] <= e_last[je]:
+                    c_and_x_and_e += 1
+
+        return c_and_x, c_and_x_and_e, not_c_and_x_and_e
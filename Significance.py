@@ -0,0 +1,118 @@
+"""
+False discovery rates of epsilon values, replacing the R round-trip of R/causal_significance.R.
+The epsilon values are standardized with their own mean and standard deviation (empirical null),
+turned into one-sided normal p-values, and converted to q-values with a port of qvalue_truncp from the
+R qvalue package (Storey et al.).
+"""
+
+import pandas as pd
+import numpy as np
+from scipy.stats import norm
+from scipy.interpolate import make_smoothing_spline
+
+def compute_q(epsilons: pd.DataFrame, by: str = None) -> pd.DataFrame:
+    """
+    Adds the columns z, p and q to a data frame with an 'epsilon' column.
+    All epsilon values are treated as one batch, as in R/causal_significance.R. With *by*, rows with the same value in that column
+    (e.g. 'effect') form separate batches, all computed in one call.
+    Missing epsilon values get missing z, p and q values.
+    """
+    result = epsilons.copy()
+    result['z'] = np.nan
+    result['p'] = np.nan
+    result['q'] = np.nan
+
+    groups = [result.index] if by == None else result.groupby(by, sort=False).groups.values()
+    for index in groups:
+        epsilon = result.loc[index, 'epsilon'].to_numpy(dtype=np.float64)
+        z, p, q = q_values(epsilon)
+        result.loc[index, 'z'] = z
+        result.loc[index, 'p'] = p
+        result.loc[index, 'q'] = q
+
+    return result
+
+def q_values(epsilon: np.ndarray):
+    """
+    z-scores, p-values and q-values of one batch of epsilon values.
+    """
+    z = np.full(len(epsilon), np.nan)
+    p = np.full(len(epsilon), np.nan)
+    q = np.full(len(epsilon), np.nan)
+
+    valid = ~np.isnan(epsilon)
+    if valid.sum() < 2:
+        return z, p, q
+
+    # Empirical null: standardize with the mean and (sample) standard deviation of the batch
+    z[valid] = (epsilon[valid] - epsilon[valid].mean()) / epsilon[valid].std(ddof=1)
+    p[valid] = norm.sf(z[valid])
+    q[valid] = qvalue_truncp(p[valid])
+
+    return z, p, q
+
+def qvalue_truncp(p: np.ndarray) -> np.ndarray:
+    """
+    q-values for truncated p-values, as qvalue::qvalue_truncp: the p-values are rescaled by their maximum before estimating pi0.
+    """
+    p = np.asarray(p, dtype=np.float64)
+    if p.min() < 0 or p.max() > 1:
+        raise ValueError("p-values not in valid range [0, 1].")
+
+    p = p / p.max()
+    pi0 = pi0est(p)
+
+    # Step-up: q_(i) = pi0 * min(1, min_{j >= i} p_(j) * m / j)
+    m = len(p)
+    order = np.argsort(-p, kind='stable')
+    ranks = np.arange(m, 0, -1)
+    q = np.empty(m)
+    q[order] = pi0 * np.minimum(1, np.minimum.accumulate(p[order] * m / ranks))
+
+    return q
+
+def pi0est(p: np.ndarray, smooth_df: float = 3) -> float:
+    """
+    Proportion of true null hypotheses, as qvalue::pi0est with the default "smoother" method.
+    """
+    lambdas = 0.05 + np.arange(19) * 0.05
+    if p.max() < lambdas.max():
+        raise ValueError("maximum p-value is smaller than lambda range.")
+
+    m = len(p)
+    pi0 = np.array([np.count_nonzero(p >= l) for l in lambdas]) / (m * (1 - lambdas))
+
+    smooth = smooth_spline(lambdas, pi0, smooth_df)
+    pi0 = min(smooth[-1], 1)
+
+    if pi0 <= 0:
+        raise ValueError("The estimated pi0 <= 0. Check that you have valid p-values.")
+
+    return pi0
+
+def smooth_spline(x: np.ndarray, y: np.ndarray, df: float) -> np.ndarray:
+    """
+    Fitted values of a cubic smoothing spline with *df* equivalent degrees of freedom, as R's smooth.spline(x, y, df = df).
+    The penalty is chosen so that the trace of the smoother matrix equals *df*.
+    """
+    identity = np.eye(len(x))
+
+    def trace(log_lam):
+        lam = np.exp(log_lam)
+        try:
+            # Smoothing every unit vector at once gives the smoother matrix
+            return np.trace(make_smoothing_spline(x, identity, lam=lam)(x))
+        except ValueError:
+            # SciPy < 1.16 only smooths 1-D y: column i of the smoother matrix is the fit of unit vector i
+            return sum(make_smoothing_spline(x, identity[i], lam=lam)(x[i]) for i in range(len(x)))
+
+    # The trace decreases from n (interpolation) to 2 (straight line) as the penalty grows
+    lo, hi = -30.0, 30.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if trace(mid) > df:
+            lo = mid
+        else:
+            hi = mid
+
+    return make_smoothing_spline(x, y, lam=np.exp((lo + hi) / 2))(x)
@@ -0,0 +1,102 @@
+import pandas as pd
+import numpy as np
+
+class SyntheticLog:
+    """
+    Generates event logs of a process with known root causes, to benchmark and check AITIA-PM on logs of any size.
+
+    Every case is a sequence of random activities, each performed by a random resource, with exponentially distributed
+    time between events (in hours). The first *causes* activities are genuine causes of the effect: a case in which one of
+    them occurred ends with the effect activity with probability *effect_probability*, any other case with *base_probability*.
+    """
+
+    def __init__(self, cases: int = 1000, activities: int = 20, resources: int = 5, trace_length: tuple = (5, 20), causes: int = 2,
+                 effect: str = "Unresolved Complaint", effect_probability: float = 0.8, base_probability: float = 0.1, seed: int = None) -> None:
+        """
+        Parameters:
+            cases: the number of cases.
+            activities: the number of different activities, named "Activity 0", "Activity 1", ...
+            resources: the number of different resources, named "Resource 0", "Resource 1", ...
+            trace_length: the (minimum, maximum) number of activities per case, without the effect.
+            causes: the number of activities that are genuine causes of the effect.
+            effect: the name of the effect activity.
+            effect_probability: the probability of the effect in a case containing a genuine cause.
+            base_probability: the probability of the effect in any other case.
+            seed: the seed of the random generator.
+        """
+        if trace_length[0] < 1 or trace_length[0] > trace_length[1]:
+            raise ValueError(f"trace_length must be a (minimum, maximum) pair with a minimum of at least 1. You passed {trace_length}.")
+
+        if causes > activities:
+            raise ValueError(f"The number of causes ({causes}) cannot exceed the number of activities ({activities}).")
+
+        self.cases = cases
+        self.activities = activities
+        self.resources = resources
+        self.trace_length = trace_length
+        self.effect = effect
+        self.effect_probability = effect_probability
+        self.base_probability = base_probability
+        self.seed = seed
+
+        self.genuine_causes = [f"Activity {i}" for i in range(causes)]
+
+    def generate(self) -> pd.DataFrame:
+        """
+        Generate the log as a prepared event log: one row per event, with relative timestamps in hours, sorted by time.
+        """
+        rng = np.random.default_rng(self.seed)
+        low, high = self.trace_length
+
+        lengths = rng.integers(low, high + 1, self.cases)
+        cases = np.repeat(np.arange(self.cases), lengths)
+        activities = rng.integers(0, self.activities, len(cases))
+        resources = rng.integers(0, self.resources, len(cases))
+
+        # Cases start at random moments within a year; events follow each other after exponential gaps
+        starts = np.cumsum(lengths) - lengths
+        gaps = rng.exponential(1.0, len(cases))
+        cumulative = np.cumsum(gaps)
+        times = np.repeat(rng.uniform(0, 365 * 24, self.cases) - cumulative[starts] + gaps[starts], lengths) + cumulative
+
+        # The effect ends a case, more often when a genuine cause occurred
+        caused = np.bincount(cases[activities < len(self.genuine_causes)], minlength=self.cases) > 0
+        affected = np.flatnonzero(rng.random(self.cases) < np.where(caused, self.effect_probability, self.base_probability))
+        case_end = times[starts + lengths - 1]
+
+        activity_names = np.array([f"Activity {i}" for i in range(self.activities)] + [self.effect], dtype=object)
+        resource_names = np.array([f"Resource {i}" for i in range(self.resources)], dtype=object)
+
+        log = pd.DataFrame({
+            'case:concept:name': pd.Categorical.from_codes(np.concatenate([cases, affected]), categories=[f"C{i}" for i in range(self.cases)]),
+            'concept:name': pd.Categorical.from_codes(np.concatenate([activities, np.full(len(affected), self.activities)]), categories=activity_names),
+            'org:resource': pd.Categorical.from_codes(np.concatenate([resources, rng.integers(0, self.resources, len(affected))]), categories=resource_names),
+            'time:timestamp': np.concatenate([times, case_end[affected] + rng.exponential(1.0, len(affected))]),
+        })
+
+        return log.sort_values('time:timestamp', kind='stable').reset_index(drop=True)
+
+    def write_csv(self, path: str) -> None:
+        """
+        Write the log as a CSV file, which prepare_event_log() reads as an already prepared log.
+        """
+        self.generate().to_csv(path, index=False)
+
+    def write_xes(self, path: str, start: str = "2020-01-01") -> None:
+        """
+        Write the log as an XES event log, with absolute timestamps counted from *start*.
+        """
+        log = self.generate().sort_values(['case:concept:name', 'time:timestamp'], kind='stable')
+        timestamps = (pd.Timestamp(start, tz='UTC') + pd.to_timedelta(log['time:timestamp'], unit='h')).dt.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+        events = ('<event><string key="concept:name" value="' + log['concept:name'].astype(str) + '"/>'
+                  '<string key="org:resource" value="' + log['org:resource'].astype(str) + '"/>'
+                  '<date key="time:timestamp" value="' + timestamps + '"/></event>')
+
+        with open(path, mode='w') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8" ?>\n<log xes.version="1.0">\n')
+            for case, case_events in events.groupby(log['case:concept:name'], sort=False, observed=True):
+                f.write(f'<trace><string key="concept:name" value="{case}"/>')
+                f.write(''.join(case_events))
+                f.write('</trace>\n')
+            f.write('</log>\n')
@@ -0,0 +1,103 @@
+import pandas as pd
+import numpy as np
+
+class TraceStore:
+    """
+    Events of a log (or observations of a search space) grouped by case, in CSR form: the events of case code i are found at
+    offsets[i]:offsets[i + 1] of every event array, so the trace of any case is a view, without filtering the log.
+
+    Cases are numbered in order of first appearance. Within a case, events are sorted by time (stable), or kept in their original order.
+    Text columns are stored as integer codes in the order of the events, with their labels, and encoded on first use.
+    """
+
+    def __init__(self, frame: pd.DataFrame, by_time: bool = True) -> None:
+        """
+        Parameters:
+            frame: events with at least the columns "case:concept:name" and "time:timestamp".
+            by_time: sort the events of every case by time. Otherwise, they keep the order of *frame*.
+        """
+        self.frame = frame
+        cases, self.case_labels = pd.factorize(frame['case:concept:name'])
+        times = frame['time:timestamp'].to_numpy(dtype=np.float64)
+
+        # Position in *frame* of every event of the store
+        self.order = np.lexsort((times, cases)) if by_time else np.argsort(cases, kind='stable')
+        self.cases = cases[self.order].astype(np.int64)
+        self.times = times[self.order]
+        self.offsets = np.searchsorted(self.cases, np.arange(len(self.case_labels) + 1))
+
+        self.codes = {}
+        self.labels = {}
+
+    def __len__(self) -> int:
+        return len(self.cases)
+
+    def to_frame_order(self, values: np.ndarray) -> np.ndarray:
+        """
+        Values given per event in the order of the store, rearranged into the order of *frame*.
+        """
+        result = np.empty(len(values), dtype=values.dtype)
+        result[self.order] = values
+        return result
+
+    def get_trace(self, case: int) -> slice:
+        """
+        The positions of the events of a case code in the event arrays.
+        """
+        return slice(self.offsets[case], self.offsets[case + 1])
+
+    def get_codes(self, column: str) -> np.ndarray:
+        """
+        The integer code of *column* for every event, in the order of the store. Missing values get -1.
+        """
+        if column not in self.codes:
+            codes, self.labels[column] = pd.factorize(self.frame[column])
+            self.codes[column] = codes[self.order]
+
+        return self.codes[column]
+
+    def get_code(self, column: str, value) -> int:
+        """
+        The code of a value of *column*. A value that does not occur gets a code that no event has.
+        """
+        self.get_codes(column)
+        code = pd.Index(self.labels[column]).get_indexer([value])[0]
+
+        return int(code) if code >= 0 else len(self.labels[column])
+
+    def get_start_times(self) -> np.ndarray:
+        """
+        The time of the earliest event of every case (NaN timestamps are skipped).
+        """
+        return np.fmin.reduceat(self.times, self.offsets[:-1]) if len(self.times) > 0 else np.empty(0)
+
+    def get_end_times(self) -> np.ndarray:
+        """
+        The time of the latest event of every case (NaN timestamps are skipped).
+        """
+        return np.fmax.reduceat(self.times, self.offsets[:-1]) if len(self.times) > 0 else np.empty(0)
+
+    @staticmethod
+    def segmented_searchsorted(segments: np.ndarray, values: np.ndarray, query_segments: np.ndarray, query_values: np.ndarray, side: str = 'left') -> np.ndarray:
+        """
+        Searchsorted within segments: *values* must be sorted within every segment and the segments must be sorted.
+        For every query, returns the index of the first value of its segment that is >= (side='left') or > (side='right') the query value.
+        When there is no such value, the index points past the end of the segment.
+        """
+        unique_values, scale, keys = TraceStore.rank_keys(segments, values)
+        queries = query_segments.astype(np.int64) * scale + np.searchsorted(unique_values, query_values, side=side)
+        return np.searchsorted(keys, queries, side='left')
+
+    @staticmethod
+    def rank_keys(segments: np.ndarray, values: np.ndarray):
+        """
+        Encode (segment, value) pairs into one sortable integer, by replacing every value by its exact rank among the unique values.
+        Queries are encoded the same way, with np.searchsorted(unique_values, query) as rank.
+
+        Returns:
+            The unique values, the scale of the segments in the keys, and the keys.
+        """
+        unique_values = np.unique(values)
+        scale = len(unique_values) + 1
+
+        return unique_values, scale, segments.astype(np.int64) * scale + np.searchsorted(unique_values, values)
@@ -0,0 +1,244 @@
+import gzip
+import random
+from array import array
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+import numpy as np
+
+# Since pandas 2, to_datetime infers one format from the first timestamp and fails on the others, e.g. with and without milliseconds.
+# 'ISO8601' parses every ISO 8601 variant, as pandas 1 does by default (where the option does not exist).
+TIMESTAMP_FORMAT = {'format': 'ISO8601'} if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+class XESReader:
+    """
+    Streaming reader for XES event logs (.xes and .xes.gz).
+    The log is parsed trace by trace with iterparse, so the full event log is never held in memory as objects.
+    Events are written straight into typed columns: text attributes are dictionary-encoded into categoricals,
+    numbers into float64 and timestamps into float64 (or int64) time units relative to the earliest event.
+    Trace attributes are prefixed with 'case:', as in pm4py.
+    """
+
+    # Number of timestamps converted at once
+    CHUNK_SIZE = 100000
+
+    def __init__(self, filepath: str, time_factor: float = 1, columns: list = None, sample: int = None, seed: int = None, integer_time: bool = False) -> None:
+        """
+        Parameters:
+            filepath: path to the .xes or .xes.gz file.
+            time_factor: number of seconds in one time unit.
+            columns: the attributes to keep. By default, all attributes are kept.
+                     'case:concept:name', 'concept:name' and 'time:timestamp' are always kept.
+            sample: the number of traces to keep, drawn uniformly at random while parsing (reservoir sampling).
+            seed: seed for the sampling.
+            integer_time: store timestamps as whole time units (int64, rounded down), so they compare exactly. Every event needs a timestamp.
+        """
+        self.filepath = filepath
+        self.time_factor = time_factor
+        self.integer_time = integer_time
+        self.columns = None if columns == None else set(columns) | {'case:concept:name', 'concept:name', 'time:timestamp'}
+        self.sample = sample
+        self.random = random.Random(seed)
+
+        # Timestamps are made relative to this epoch time in nanoseconds, by default the earliest event (see to_dataframe)
+        self.origin = None
+
+    def read(self) -> pd.DataFrame:
+        """
+        Parse the log into a data frame with one row per event.
+        """
+        self.origin = None
+        self.reset()
+
+        if self.sample == None:
+            for trace in self.iterate_traces():
+                self.add_trace(trace)
+        else:
+            # Keep a uniform random sample of traces without knowing the number of traces up front
+            reservoir = []
+            for i, trace in enumerate(self.iterate_traces()):
+                if i < self.sample:
+                    reservoir.append(trace)
+                else:
+                    j = self.random.randint(0, i)
+                    if j < self.sample:
+                        reservoir[j] = trace
+            for trace in reservoir:
+                self.add_trace(trace)
+
+        return self.to_dataframe()
+
+    def iterate_chunks(self, events: int):
+        """
+        Yields the log as data frames of whole traces, with at least *events* events each (except the last one), in the order of the file.
+        Only one chunk is held in memory at a time. The number of events can be changed between chunks through *chunk_events*.
+        Timestamps of all chunks are relative to the earliest event of the first chunk, so they can be negative in later chunks.
+        Sampling is not supported.
+        """
+        self.chunk_events = events
+        self.origin = None
+        self.reset()
+
+        for trace in self.iterate_traces():
+            self.add_trace(trace)
+            if self.rows >= self.chunk_events:
+                yield self.to_dataframe()
+                self.reset()
+
+        if self.rows > 0:
+            yield self.to_dataframe()
+
+    def reset(self) -> None:
+        self.rows = 0
+        self.buffers = {}
+        self.pending_times = []
+        self.times = []
+
+    def iterate_traces(self):
+        """
+        Yields every trace as a tuple (trace attributes, list of event attributes).
+        """
+        opener = gzip.open if self.filepath.lower().endswith('.gz') else open
+        with opener(self.filepath, 'rb') as f:
+            trace_attributes, events, event = None, None, None
+            parents = []
+            root = None
+
+            for action, elem in ET.iterparse(f, events=('start', 'end')):
+                tag = elem.tag.rsplit('}', 1)[-1]
+
+                if action == 'start':
+                    if root == None:
+                        root = elem
+                    if tag == 'trace':
+                        trace_attributes, events = {}, []
+                    elif tag == 'event' and events != None:
+                        event = {}
+                    parents.append(tag)
+                    continue
+
+                parents.pop()
+                parent = parents[-1] if len(parents) > 0 else None
+
+                if tag == 'event' and event != None:
+                    events.append(event)
+                    event = None
+                elif tag == 'trace' and trace_attributes != None:
+                    yield (trace_attributes, events)
+                    trace_attributes, events = None, None
+                    # Free the parsed trace
+                    root.clear()
+                elif parent == 'event' and event != None:
+                    self.add_attribute(event, tag, elem, '')
+                elif parent == 'trace' and trace_attributes != None:
+                    self.add_attribute(trace_attributes, tag, elem, 'case:')
+
+    def add_attribute(self, target: dict, tag: str, elem, prefix: str) -> None:
+        key = elem.get('key')
+        if key == None or tag in ('list', 'container'):
+            return
+        key = prefix + key
+        if self.columns != None and key not in self.columns:
+            return
+        target[key] = (tag, elem.get('value'))
+
+    def add_trace(self, trace) -> None:
+        trace_attributes, events = trace
+        for event in events:
+            event.update(trace_attributes)
+            for key, (tag, value) in event.items():
+                if key == 'time:timestamp':
+                    continue
+                if key not in self.buffers:
+                    self.buffers[key] = XESColumn(tag)
+                self.buffers[key].add(value, self.rows)
+
+            self.pending_times.append(event['time:timestamp'][1] if 'time:timestamp' in event else None)
+            self.rows += 1
+            if len(self.pending_times) >= XESReader.CHUNK_SIZE:
+                self.convert_times()
+
+    def convert_times(self) -> None:
+        # Convert the collected timestamps to epoch nanoseconds in one vectorized call
+        if len(self.pending_times) > 0:
+            # Missing timestamps become NaT, stored as the minimum int64
+            times = pd.to_datetime(pd.Series(self.pending_times, dtype=object), utc=True, **TIMESTAMP_FORMAT)
+            self.times.append(times.to_numpy(dtype='datetime64[ns]').view(np.int64))
+            self.pending_times = []
+
+    def to_dataframe(self) -> pd.DataFrame:
+        self.convert_times()
+        data = {key: column.to_series(self.rows) for key, column in self.buffers.items()}
+
+        # Time units relative to the earliest event
+        times = np.concatenate(self.times) if len(self.times) > 0 else np.empty(0, dtype=np.int64)
+        data['time:timestamp'], self.origin = XESReader.to_time_units(times, self.time_factor, self.origin, self.integer_time)
+
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def to_time_units(times: np.ndarray, time_factor: float, origin: int = None, integer: bool = False):
+        """
+        Convert epoch nanoseconds (missing timestamps as the minimum int64, like NaT) to time units relative to *origin*,
+        by default the earliest timestamp: one subtraction and one division over the whole array.
+
+        Parameters:
+            times: int64 epoch nanoseconds.
+            time_factor: number of seconds in one time unit.
+            origin: epoch nanoseconds of time 0.
+            integer: return whole time units (int64, rounded down) instead of float64. Every timestamp must be present.
+
+        Returns:
+            The time units and the origin.
+        """
+        missing = times == np.iinfo(np.int64).min
+        if origin == None and not missing.all():
+            origin = int(times[~missing].min())
+
+        if integer:
+            if missing.any():
+                raise ValueError(f"Integer time units require a timestamp on every event. {np.count_nonzero(missing)} events have none.")
+            return (times - (origin if origin != None else 0)) // int(round(1e9 * time_factor)), origin
+
+        relative = np.full(len(times), np.nan)
+        if origin != None:
+            relative[~missing] = (times[~missing] - origin) / (1e9 * time_factor)
+
+        return relative, origin
+
+
+class XESColumn:
+    """
+    Typed buffer for the values of one attribute. Rows without a value are filled with NaN, also before the first row with a value.
+    """
+
+    def __init__(self, tag: str) -> None:
+        self.numeric = tag in ('int', 'float')
+        self.boolean = tag == 'boolean'
+        self.values = array('d')
+        self.codes = array('i')
+        self.categories = {}
+        # Number of rows filled so far: rows before the first value are padded by add()
+        self.rows = 0
+
+    def add(self, value, row: int) -> None:
+        if self.numeric:
+            if row > self.rows:
+                self.values.extend([np.nan] * (row - self.rows))
+            self.values.append(float(value))
+        else:
+            if row > self.rows:
+                self.codes.extend([-1] * (row - self.rows))
+            if self.boolean:
+                value = value.lower() == 'true'
+            if value not in self.categories:
+                self.categories[value] = len(self.categories)
+            self.codes.append(self.categories[value])
+        self.rows = row + 1
+
+    def to_series(self, rows: int) -> pd.Series:
+        if self.numeric:
+            return pd.Series(np.append(np.frombuffer(self.values, dtype=np.float64), np.full(rows - self.rows, np.nan)))
+
+        codes = np.append(np.frombuffer(self.codes, dtype=np.int32), np.full(rows - self.rows, -1, dtype=np.int32))
+        return pd.Series(pd.Categorical.from_codes(codes, categories=list(self.categories)))
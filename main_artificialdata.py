@@ -21,7 +21,7 @@ if __name__ == "__main__":
         # Create Hypothesizer object and format the log
         hyp = Hypothesizer(data)
 
-        hyp.prepare_event_log("hours", sample = 5000)
+        hyp.prepare_event_log("hours", sample = 5000, cache = os.path.join("Data", "cache"))
 
         # Show the different log attributes
         # print(hyp.data.columns)
@@ -37,9 +37,9 @@ if __name__ == "__main__":
         hyp.observe_not_exists_attribute('concept:name', '2nd Opinion Initial Assessment')
 
         ### When the first communication to the customer is not done in time, the customer will bear harsh feelings towards us.
-        # hyp.observe_not_exists_attribute('concept:name', 'Communicate Initial Assessment', by_time = 12)
         hyp.observe_not_exists_attribute('concept:name', 'Communicate Initial Assessment', by_time = 24)
-        # hyp.observe_not_exists_attribute('concept:name', 'Communicate Initial Assessment', by_time = 48)
+        # To compare several thresholds in one run:
+        # hyp.observe_not_exists_attribute_sweep('concept:name', 'Communicate Initial Assessment', by_times = [12, 24, 48])
 
         ### When Analyst 4 performs "Investigation and Analysis", we expect the customer to become unhappy due to sloppiness. For confounding: check all resource & activity combinations
         hyp.observe_exists(activities=True, resources=True)
@@ -86,7 +86,7 @@ if __name__ == "__main__":
         inference.generate_hypotheses_for_effects(causes = inference.alphabet, effects = ["Unresolved Complaint"])
         inference.test_for_prima_facie()
         # print(inference.prima_facie)
-        inference.calculate_average_epsilons(os.path.join("Output", "VSI_Revision_NoGenuines.csv"))
+        inference.calculate_average_epsilons(os.path.join("Output", "VSI_Revision_NoGenuines.csv"), batch = True, significance = True)
 
         end2 = datetime.datetime.now().replace(microsecond=0)
         print(f"=== Total Inference time:\t\t{end2-start2}. ===")
@@ -0,0 +1,105 @@
+from Inference import Inference
+from Hypothesizer import Hypothesizer
+from SyntheticLog import SyntheticLog
+import os
+import json
+import time
+import datetime
+import tempfile
+import subprocess
+import tracemalloc
+
+### ------------
+### Main program
+### ------------
+sizes = [1000, 10000]           # Number of cases of every generated log
+activities = 20
+resources = 5
+trace_length = (5, 20)
+causes = 2
+ingest = "csv"                  # "csv", or "xes" to read the log with the streaming XES reader
+trace_memory = True             # Record the peak memory of every stage (slows down the stages somewhat)
+target_file = os.path.join("Output", "benchmark.jsonl")
+
+### ---------------------------------------------------------------
+### Benchmark - time and peak memory of every stage on synthetic logs
+### ---------------------------------------------------------------
+
+def get_revision():
+    # The git revision of the code being benchmarked, if available
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_record(record: dict):
+    # Results are appended as JSON lines, so runs of different revisions can be compared
+    with open(target_file, mode='a') as f:
+        f.write(json.dumps(record) + "\n")
+
+def measure(run: dict, stage: str, function, *args, **kwargs):
+    # Call function(*args, **kwargs), and append its duration and peak memory as one JSON line to the target file
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    write_record({**run, 'stage': stage, 'seconds': round(seconds, 6), 'peak_memory_mb': None if peak == None else round(peak, 3)})
+    print(f"{stage:<40} {seconds:10.3f} s" + ("" if peak == None else f" {peak:10.1f} MB"))
+
+    return result
+
+if __name__ == "__main__":
+    revision = get_revision()
+    started = datetime.datetime.now().replace(microsecond=0).isoformat()
+
+    for cases in sizes:
+        run = {'started': started, 'revision': revision, 'cases': cases, 'activities': activities, 'resources': resources,
+               'trace_length': list(trace_length), 'causes': causes, 'ingest': ingest}
+        print(f"=== Benchmark on {cases} cases ===")
+
+        with tempfile.TemporaryDirectory(prefix="aitia-benchmark-") as folder:
+            log = SyntheticLog(cases, activities, resources, trace_length, causes, seed=cases)
+            path = os.path.join(folder, f"log.{ingest}")
+            measure(run, "generate", log.write_xes if ingest == "xes" else log.write_csv, path)
+
+            # Hypothesizer
+            hyp = Hypothesizer(path)
+            measure(run, "ingest", hyp.prepare_event_log, "hours", streaming = ingest == "xes")
+
+            measure(run, "observe_exists_single_value", hyp.observe_exists_single_value, 'concept:name', log.effect)
+            measure(run, "observe_exists", hyp.observe_exists, activities=True)
+            measure(run, "observe_exists (activity - resource)", hyp.observe_exists, activities=True, resources=True)
+            measure(run, "observe_not_exists_attribute", hyp.observe_not_exists_attribute, 'concept:name', 'Activity 1', by_time = 24)
+            measure(run, "observe_and", hyp.observe_and, 'concept:name', {'Activity 2', 'Activity 3'})
+            measure(run, "observe_or", hyp.observe_or, 'concept:name', ['Activity 2', 'Activity 3'])
+            measure(run, "observe_directly_follows", hyp.observe_directly_follows, 'Activity 2', 'Activity 3')
+            measure(run, "observe_follows_within", hyp.observe_follows_within, 'Activity 2', 'Activity 3', 12)
+            measure(run, "observe_follows_within (negative)", hyp.observe_follows_within, 'Activity 2', 'Activity 3', 12, negative = True)
+            measure(run, "observe_activity_resource_relations", hyp.observe_activity_resource_relations, ('Activity 4', 'Activity 5'))
+            measure(run, "observe_case_delay", hyp.observe_case_delay, 0.5)
+
+            search_space = os.path.join(folder, "search_space")
+            measure(run, "export_observations", hyp.export_observations, search_space)
+            del hyp
+
+            # Inference
+            inference = measure(run, "populate_vars", Inference, search_space, False)
+            # Observations of the effect itself (e.g. "effect - resource") are no candidate causes
+            candidates = [obs for obs in inference.alphabet if log.effect not in obs]
+            measure(run, "generate_hypotheses", inference.generate_hypotheses_for_effects, candidates, [log.effect])
+            measure(run, "prima_facie", inference.test_for_prima_facie)
+            measure(run, "epsilon", inference.calculate_average_epsilons, os.path.join(folder, "epsilons.csv"), batch = True)
+
+            # Check that the genuine causes come out on top
+            ranking = sorted(inference.epsilons, key = lambda row: -row[2] if row[2] != None else 0)
+            found = len(set(log.genuine_causes) & set(cause for cause, _, _ in ranking[:causes]))
+            write_record({**run, 'stage': "genuine_causes_on_top", 'found': found})
+            print(f"{found} of {causes} genuine causes ranked on top.")
@@ -19,7 +19,7 @@ if __name__ == "__main__":
         # Create Hypothesizer object and format the log
         hyp = Hypothesizer(data)
 
-        hyp.prepare_event_log("hours")
+        hyp.prepare_event_log("hours", cache = os.path.join("Data", "cache"))
 
         # Show the different log attributes
         print(hyp.data.columns)
@@ -66,7 +66,7 @@ if __name__ == "__main__":
     inference = Inference(os.path.join("Data", "RTFM Search Space.csv"), pb = True)
     inference.generate_hypotheses_for_effects(causes = inference.alphabet, effects = ["Send for Credit Collection"])
     inference.test_hypotheses()
-    inference.calculate_average_epsilons(os.path.join("Output", "RTFM.csv"))
+    inference.calculate_average_epsilons(os.path.join("Output", "RTFM.csv"), batch = True, significance = True)
 
     end2 = datetime.datetime.now().replace(microsecond=0)
     print(f"=== Total Inference time:\t\t{end2-start2}. ===")
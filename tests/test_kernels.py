@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Kernels
+
+PATHS = [False, pytest.param(True, marks=pytest.mark.skipif(Kernels.numba == None, reason="Numba is not installed"))]
+
+def make_log(seed, cases = 60, observations = 6):
+    """
+    A small synthetic per observation index: for every observation, the sorted codes of the cases it occurs in,
+    with its first and last time per case. Some observations occur in no case and some times are missing.
+    """
+    rng = np.random.default_rng(seed)
+    index = []
+    for obs in range(observations):
+        p = 0 if obs == observations - 1 else rng.uniform(0.1, 0.9)
+        occurs = np.flatnonzero(rng.random(cases) < p)
+        first = rng.integers(0, 10, len(occurs)).astype(np.float64)
+        last = first + rng.integers(0, 5, len(occurs))
+        first[rng.random(len(occurs)) < 0.1] = np.nan
+        last[rng.random(len(occurs)) < 0.1] = np.nan
+        index.append((occurs.astype(np.int64), first, last))
+
+    return index
+
+def as_cases(cases, times):
+    return dict(zip(cases.tolist(), times.tolist()))
+
+def count_before_sets(c_cases, c_first, e_cases, e_last):
+    # The counting of Inference before the kernels: per case in both sets, is c no later than the last e
+    c_first, e_last = as_cases(c_cases, c_first), as_cases(e_cases, e_last)
+    return sum(1 for case in set(c_first) & set(e_last) if c_first[case] <= e_last[case])
+
+def count_epsilon_x_sets(x_cases, x_first, c_cases, c_first, e_cases, e_last):
+    x_first, c_first, e_last = as_cases(x_cases, x_first), as_cases(c_cases, c_first), as_cases(e_cases, e_last)
+    x_before_e = {case for case in set(x_first) & set(e_last) if x_first[case] <= e_last[case]}
+
+    c_and_x = len(set(x_first) & set(c_first))
+    c_and_x_and_e = sum(1 for case in x_before_e & set(c_first) if c_first[case] <= e_last[case])
+    not_c_and_x_and_e = len(x_before_e - set(c_first))
+
+    return c_and_x, c_and_x_and_e, not_c_and_x_and_e
+
+@pytest.mark.parametrize('jit', PATHS)
+@pytest.mark.parametrize('seed', range(5))
+def test_count_before(monkeypatch, jit, seed):
+    monkeypatch.setattr(Kernels, 'JIT', jit)
+    index = make_log(seed)
+
+    for c_cases, c_first, _ in index:
+        for e_cases, _, e_last in index:
+            assert Kernels.count_before(c_cases, c_first, e_cases, e_last) == count_before_sets(c_cases, c_first, e_cases, e_last)
+
+@pytest.mark.parametrize('jit', PATHS)
+@pytest.mark.parametrize('seed', range(5))
+def test_count_epsilon_x(monkeypatch, jit, seed):
+    monkeypatch.setattr(Kernels, 'JIT', jit)
+    index = make_log(seed)
+
+    for x_cases, x_first, _ in index:
+        for c_cases, c_first, _ in index:
+            for e_cases, _, e_last in index:
+                expected = count_epsilon_x_sets(x_cases, x_first, c_cases, c_first, e_cases, e_last)
+                assert Kernels.count_epsilon_x(x_cases, x_first, c_cases, c_first, e_cases, e_last) == expected
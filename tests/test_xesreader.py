@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XESReader import XESReader
+
+LOG = """<?xml version="1.0" encoding="UTF-8" ?>
+<log xes.version="1.0" xmlns="http://www.xes-standard.org/">
+  <trace>
+    <string key="concept:name" value="1"/>
+    <event>
+      <string key="concept:name" value="Create"/>
+      <date key="time:timestamp" value="2020-01-01T00:00:00+01:00"/>
+    </event>
+    <event>
+      <string key="concept:name" value="Pay"/>
+      <float key="expense" value="11.0"/>
+      <date key="time:timestamp" value="2020-01-01T01:00:00.000+01:00"/>
+    </event>
+    <event>
+      <string key="concept:name" value="Close"/>
+      <string key="org:resource" value="R9"/>
+      <date key="time:timestamp" value="2020-01-01T03:00:00+01:00"/>
+    </event>
+  </trace>
+  <trace>
+    <string key="concept:name" value="2"/>
+    <event>
+      <string key="concept:name" value="Create"/>
+      <date key="time:timestamp" value="2020-01-02T00:00:00.500+01:00"/>
+    </event>
+  </trace>
+</log>
+"""
+
+def write_log(tmp_path):
+    path = os.path.join(tmp_path, "log.xes")
+    with open(path, 'w') as f:
+        f.write(LOG)
+    return path
+
+def test_attributes_missing_on_first_events(tmp_path):
+    data = XESReader(write_log(tmp_path), time_factor=3600).read()
+
+    assert data['concept:name'].tolist() == ['Create', 'Pay', 'Close', 'Create']
+    assert data['case:concept:name'].tolist() == ['1', '1', '1', '2']
+    np.testing.assert_array_equal(data['expense'].to_numpy(), [np.nan, 11.0, np.nan, np.nan])
+    assert data['org:resource'].isna().tolist() == [True, True, False, True]
+    assert data['org:resource'][2] == 'R9'
+
+def test_chunks_keep_attributes_on_their_events(tmp_path):
+    chunks = list(XESReader(write_log(tmp_path), time_factor=3600).iterate_chunks(1))
+
+    assert [len(chunk.index) for chunk in chunks] == [3, 1]
+    np.testing.assert_array_equal(chunks[0]['expense'].to_numpy(), [np.nan, 11.0, np.nan])
+    assert chunks[0]['org:resource'].isna().tolist() == [True, True, False]
+
+def test_mixed_timestamp_precision(tmp_path):
+    data = XESReader(write_log(tmp_path), time_factor=3600).read()
+
+    np.testing.assert_allclose(data['time:timestamp'].to_numpy(), [0, 1, 3, 24 + 0.5 / 3600])